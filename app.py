@@ -14,7 +14,7 @@ app = Flask(__name__,
 app.secret_key = os.environ.get("SESSION_SECRET")
 if not app.secret_key:
     app.secret_key = 'dev-secret-key-change-in-production'
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
@@ -23,6 +23,7 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
+app.config['MEMO_DEBUG_HEADER'] = os.environ.get('MEMO_DEBUG_HEADER', '').lower() in ('1', 'true', 'yes')
 
 from models import db
 db.init_app(app)
@@ -46,6 +47,14 @@ app.register_blueprint(admin)
 
 @app.after_request
 def add_header(response):
+    if app.config['MEMO_DEBUG_HEADER'] or app.debug:
+        from utils.memo import memo_stats
+        stats = memo_stats()
+        if stats:
+            response.headers['X-Memo-Stats'] = 'hits={hits}; misses={misses}'.format(**stats)
+    
+    if response.cache_control.public:
+        return response
     response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
     response.headers['Pragma'] = 'no-cache'
     response.headers['Expires'] = '0'
@@ -55,8 +64,16 @@ with app.app_context():
     import models as m
     db.create_all()
     
+    from security.rate_limiter import rate_limiter
+    rate_limiter.configure(engine=db.engine)
+    
     from data.init_db import init_database
-    init_database(db, m)
+    if init_database(db, m):
+        from services.conversation_service import ConversationService
+        ConversationService.backfill()
+        
+        from services.user_stats_service import UserStatsService
+        UserStatsService.backfill()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -263,7 +263,8 @@ def init_database(db, models):
     team = user_map.get('team@shida.com')
     
     if demo_user and naomie:
-        match1 = Match(user1_id=demo_user.id, user2_id=naomie.id, compatibility_score=85)
+        user1_id, user2_id = Match.pair(demo_user.id, naomie.id)
+        match1 = Match(user1_id=user1_id, user2_id=user2_id, compatibility_score=85)
         db.session.add(match1)
         db.session.flush()
         
@@ -272,11 +273,13 @@ def init_database(db, models):
         db.session.add_all([msg1, msg2])
     
     if demo_user and sarah:
-        match2 = Match(user1_id=demo_user.id, user2_id=sarah.id, compatibility_score=72)
+        user1_id, user2_id = Match.pair(demo_user.id, sarah.id)
+        match2 = Match(user1_id=user1_id, user2_id=user2_id, compatibility_score=72)
         db.session.add(match2)
     
     if demo_user and team:
-        match3 = Match(user1_id=team.id, user2_id=demo_user.id, compatibility_score=100)
+        user1_id, user2_id = Match.pair(team.id, demo_user.id)
+        match3 = Match(user1_id=user1_id, user2_id=user2_id, compatibility_score=100)
         db.session.add(match3)
         db.session.flush()
         
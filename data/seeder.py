@@ -74,14 +74,16 @@ def seed_database(db, models):
         team = user_map.get('team@shida.com')
         
         if demo_user and naomie:
-            match1 = Match(user1_id=demo_user.id, user2_id=naomie.id, compatibility_score=85.5)
+            user1_id, user2_id = Match.pair(demo_user.id, naomie.id)
+            match1 = Match(user1_id=user1_id, user2_id=user2_id, compatibility_score=85.5)
             db.session.add(match1)
             db.session.flush()
             msg1 = Message(match_id=match1.id, sender_id=naomie.id, content="J'ai bien reçu votre offre...")
             db.session.add(msg1)
         
         if demo_user and sarah:
-            match2 = Match(user1_id=demo_user.id, user2_id=sarah.id, compatibility_score=72.0)
+            user1_id, user2_id = Match.pair(demo_user.id, sarah.id)
+            match2 = Match(user1_id=user1_id, user2_id=user2_id, compatibility_score=72.0)
             db.session.add(match2)
             db.session.flush()
             msg2 = Message(match_id=match2.id, sender_id=demo_user.id, content="Bonjour ! Ravi de faire votre connaissance")
@@ -90,7 +92,8 @@ def seed_database(db, models):
             db.session.add(msg2_reply)
         
         if demo_user and team:
-            match3 = Match(user1_id=demo_user.id, user2_id=team.id, compatibility_score=100.0)
+            user1_id, user2_id = Match.pair(demo_user.id, team.id)
+            match3 = Match(user1_id=user1_id, user2_id=user2_id, compatibility_score=100.0)
             db.session.add(match3)
             db.session.flush()
             msg3 = Message(match_id=match3.id, sender_id=team.id, content="Bienvenue sur Shida ! Nous sommes ravis de vous accueillir. N'hésitez pas à nous contacter si vous avez des questions.")
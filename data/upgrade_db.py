@@ -0,0 +1,293 @@
+"""
+Upgrade Database - Brings tables created by older versions up to date.
+
+db.create_all() only creates missing tables; it never changes a table that
+already exists. Each step below checks the live schema first and applies one
+change, so the script is safe to run repeatedly and from several instances.
+
+Usage:
+    python -m data.upgrade_db
+"""
+import logging
+import os
+
+from sqlalchemy import bindparam, inspect, text
+
+logger = logging.getLogger('shida.upgrade_db')
+
+LOCK_KEY = 720431
+
+
+def _has_table(db, table):
+    return inspect(db.session.connection()).has_table(table)
+
+
+def _columns(db, table):
+    return {column['name'] for column in inspect(db.session.connection()).get_columns(table)}
+
+
+def _indexes(db, table):
+    return {index['name'] for index in inspect(db.session.connection()).get_indexes(table)}
+
+
+def _uniques(db, table):
+    inspector = inspect(db.session.connection())
+    return {constraint['name'] for constraint in inspector.get_unique_constraints(table)} | _indexes(db, table)
+
+
+def _add_unique(db, table, name, columns):
+    """SQLite cannot add a constraint to an existing table; a unique index
+    enforces the same rule."""
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text(f'CREATE UNIQUE INDEX {name} ON {table} ({", ".join(columns)})'))
+    else:
+        db.session.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE ({", ".join(columns)})'))
+
+
+def create_tables(db):
+    """Tables added since the database was created, so the steps below can
+    fill them."""
+    db.metadata.create_all(db.session.connection())
+
+
+def add_read_watermarks(db):
+    """conversation_summaries.last_read_message_id replaced last_message_read.
+    Seed it from the legacy is_read flags, as ConversationService.backfill()
+    does for new summaries."""
+    if not _has_table(db, 'conversation_summaries') or 'last_read_message_id' in _columns(db, 'conversation_summaries'):
+        return False
+
+    db.session.execute(text(
+        'ALTER TABLE conversation_summaries ADD COLUMN last_read_message_id INTEGER NOT NULL DEFAULT 0'
+    ))
+    db.session.execute(text(
+        'UPDATE conversation_summaries SET last_read_message_id = COALESCE(('
+        'SELECT MAX(messages.id) FROM messages '
+        'WHERE messages.match_id = conversation_summaries.match_id '
+        'AND messages.sender_id != conversation_summaries.user_id '
+        'AND messages.is_read = :is_read'
+        '), 0)'
+    ), {'is_read': True})
+    return True
+
+
+def canonicalize_matches(db):
+    """Matches used to be stored in either order, so the same pair could exist
+    twice. Merge each pair into its oldest match, carrying messages and read
+    watermarks over, store it as (lower id, higher id) and add the constraints
+    that keep it that way."""
+    if not _has_table(db, 'matches') or 'uq_matches_pair' in _uniques(db, 'matches'):
+        return False
+    from models import Match, Message, ConversationSummary
+    from services.conversation_service import ConversationService
+
+    keepers = {}
+    duplicates = {}
+    for match_id, user1_id, user2_id in db.session.query(Match.id, Match.user1_id, Match.user2_id).order_by(Match.id):
+        pair = Match.pair(user1_id, user2_id)
+        if pair in keepers:
+            duplicates[match_id] = keepers[pair]
+        else:
+            keepers[pair] = match_id
+
+    for match_id, keeper_id in duplicates.items():
+        for user_id, read_id in db.session.query(
+            ConversationSummary.user_id, ConversationSummary.last_read_message_id
+        ).filter_by(match_id=match_id):
+            ConversationSummary.query.filter(
+                ConversationSummary.match_id == keeper_id,
+                ConversationSummary.user_id == user_id,
+                ConversationSummary.last_read_message_id < read_id
+            ).update({'last_read_message_id': read_id}, synchronize_session=False)
+        ConversationSummary.query.filter_by(match_id=match_id).delete(synchronize_session=False)
+        Message.query.filter_by(match_id=match_id).update({'match_id': keeper_id}, synchronize_session=False)
+        Match.query.filter_by(id=match_id).delete(synchronize_session=False)
+
+    for keeper_id in set(duplicates.values()):
+        last_message = Message.query.filter_by(match_id=keeper_id).order_by(
+            Message.created_at.desc(), Message.id.desc()
+        ).first()
+        if not last_message:
+            continue
+        ConversationSummary.query.filter_by(match_id=keeper_id).update({
+            'last_message_id': last_message.id,
+            'last_message_sender_id': last_message.sender_id,
+            'last_message_preview': last_message.content[:ConversationService.PREVIEW_LENGTH],
+            'last_message_at': last_message.created_at,
+            'unread_count': db.session.query(db.func.count(Message.id)).filter(
+                Message.match_id == keeper_id,
+                Message.sender_id != ConversationSummary.user_id,
+                Message.id > ConversationSummary.last_read_message_id
+            ).scalar_subquery()
+        }, synchronize_session=False)
+
+    Match.query.filter(Match.user1_id > Match.user2_id).update({
+        'user1_id': Match.user2_id,
+        'user2_id': Match.user1_id
+    }, synchronize_session=False)
+
+    _add_unique(db, 'matches', 'uq_matches_pair', ('user1_id', 'user2_id'))
+    if db.engine.dialect.name != 'sqlite':
+        db.session.execute(text(
+            'ALTER TABLE matches ADD CONSTRAINT ck_matches_canonical_pair CHECK (user1_id < user2_id)'
+        ))
+    return {'merged': len(duplicates)}
+
+
+def dedupe_likes(db):
+    """Keep the oldest like of each (sender, receiver), marked as a match if any
+    of its copies was, then add the unique constraint."""
+    if not _has_table(db, 'likes') or 'uq_likes_sender_receiver' in _uniques(db, 'likes'):
+        return False
+    from models import Like
+
+    keepers = {}
+    duplicates = []
+    matched = set()
+    for like_id, sender_id, receiver_id, is_match in db.session.query(
+        Like.id, Like.sender_id, Like.receiver_id, Like.is_match
+    ).order_by(Like.id):
+        keeper_id = keepers.setdefault((sender_id, receiver_id), like_id)
+        if keeper_id != like_id:
+            duplicates.append(like_id)
+        if is_match:
+            matched.add(keeper_id)
+
+    for start in range(0, len(duplicates), 1000):
+        Like.query.filter(Like.id.in_(duplicates[start:start + 1000])).delete(synchronize_session=False)
+    matched = list(matched)
+    for start in range(0, len(matched), 1000):
+        Like.query.filter(Like.id.in_(matched[start:start + 1000])).update({'is_match': True}, synchronize_session=False)
+
+    _add_unique(db, 'likes', 'uq_likes_sender_receiver', ('sender_id', 'receiver_id'))
+    return {'removed': len(duplicates)}
+
+
+def backfill_conversation_summaries(db):
+    """Summaries of matches created before conversation_summaries existed."""
+    from services.conversation_service import ConversationService
+    return ConversationService.backfill()
+
+
+def add_user_stats_xp(db):
+    """XP columns of user_stats, with the flags and location copied from each
+    profile. recompute_xp then fills xp."""
+    if not _has_table(db, 'user_stats'):
+        return False
+    columns = _columns(db, 'user_stats')
+    missing = [
+        (name, ddl) for name, ddl in (
+            ('is_verified', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+            ('profile_complete', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+            ('location', 'VARCHAR(100)'),
+            ('xp', 'INTEGER NOT NULL DEFAULT 0')
+        ) if name not in columns
+    ]
+    if not missing:
+        return False
+    from models import Profile, UserStats
+    from services.gamification_service import GamificationService
+
+    for name, ddl in missing:
+        db.session.execute(text(f'ALTER TABLE user_stats ADD COLUMN {name} {ddl}'))
+
+    table = UserStats.__table__
+    rows = [
+        {
+            'b_user_id': profile.user_id,
+            'is_verified': bool(profile.is_verified),
+            'profile_complete': GamificationService.profile_completion(profile) >= 100,
+            'location': profile.location
+        }
+        for profile in Profile.query
+    ]
+    if rows:
+        db.session.execute(
+            db.update(table).where(table.c.user_id == bindparam('b_user_id')).values(
+                is_verified=bindparam('is_verified'),
+                profile_complete=bindparam('profile_complete'),
+                location=bindparam('location')
+            ),
+            rows
+        )
+    return [name for name, ddl in missing]
+
+
+def backfill_user_stats(db):
+    """Counters of users created before user_stats existed."""
+    from services.user_stats_service import UserStatsService
+    return UserStatsService.backfill()
+
+
+def recompute_xp(db):
+    """Stored xp follows the rewards of data/gamification.json as deployed."""
+    if not _has_table(db, 'user_stats'):
+        return False
+    from services.user_stats_service import UserStatsService
+    return UserStatsService.recompute_xp()
+
+
+def create_missing_indexes(db):
+    """Indexes declared on the models but absent from existing tables."""
+    created = []
+    connection = db.session.connection()
+    for table in db.metadata.sorted_tables:
+        if not _has_table(db, table.name):
+            continue
+        existing = _indexes(db, table.name)
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(connection)
+                created.append(index.name)
+    return created
+
+
+STEPS = [
+    create_tables,
+    add_read_watermarks,
+    canonicalize_matches,
+    dedupe_likes,
+    backfill_conversation_summaries,
+    add_user_stats_xp,
+    backfill_user_stats,
+    create_missing_indexes,
+    recompute_xp,
+]
+
+
+def upgrade(db):
+    """Run every step in its own transaction. Under PostgreSQL each step holds
+    an advisory lock, so concurrent runs apply it once and the others see the
+    result when they check the schema."""
+    applied = []
+    for step in STEPS:
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': LOCK_KEY})
+        try:
+            result = step(db)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if result:
+            logger.info("Applied %s: %s", step.__name__, result)
+            applied.append(step.__name__)
+    return applied
+
+
+def main():
+    from flask import Flask
+    from models import db
+
+    logging.basicConfig(level=logging.INFO)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+    db.init_app(app)
+
+    with app.app_context():
+        applied = upgrade(db)
+    logger.info("Database up to date (%d steps applied)", len(applied))
+
+
+if __name__ == '__main__':
+    main()
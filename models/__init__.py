@@ -1,16 +1,18 @@
 from models.base import db
 
-from models.auth import User, AdminUser
-from models.social import Profile, Like, Match, Message
+from models.auth import User, AdminUser, RateLimitCounter
+from models.social import Profile, Like, Match, Message, DiscoverySeenSet, ProfilePass, DiscoveryDeck, DiscoveryDeckEntry, DiscoveryDeckUpdate, ConversationSummary, ProfileViewBucket, ProfileView, UserStats
 from models.commerce import Subscription, TokenTransaction, PricingPlan, PromoCode
-from models.content import Notification, ContentPage, MatchingConfig
+from models.content import Notification, UserEvent, ContentPage, MatchingConfig
 from models.admin import Report, AuditLog, SupportTicket, TicketResponse
 
 __all__ = [
     'db',
-    'User', 'AdminUser',
-    'Profile', 'Like', 'Match', 'Message',
+    'User', 'AdminUser', 'RateLimitCounter',
+    'Profile', 'Like', 'Match', 'Message', 'DiscoverySeenSet', 'ProfilePass',
+    'DiscoveryDeck', 'DiscoveryDeckEntry', 'DiscoveryDeckUpdate', 'ConversationSummary', 'ProfileViewBucket',
+    'ProfileView', 'UserStats',
     'Subscription', 'TokenTransaction', 'PricingPlan', 'PromoCode',
-    'Notification', 'ContentPage', 'MatchingConfig',
+    'Notification', 'UserEvent', 'ContentPage', 'MatchingConfig',
     'Report', 'AuditLog', 'SupportTicket', 'TicketResponse'
 ]
@@ -79,3 +79,13 @@ class AdminUser(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'last_login': self.last_login.isoformat() if self.last_login else None
         }
+
+
+class RateLimitCounter(db.Model):
+    __tablename__ = 'rate_limit_counters'
+    key = db.Column(db.String(255), primary_key=True)
+    window_id = db.Column(db.BigInteger, nullable=False)
+    current = db.Column(db.Integer, default=0, nullable=False)
+    previous = db.Column(db.Integer, default=0, nullable=False)
+    blocked_until = db.Column(db.Float, default=0, nullable=False)
+    expires_at = db.Column(db.Float, nullable=False, index=True)
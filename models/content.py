@@ -24,6 +24,19 @@ class Notification(db.Model):
         }
 
 
+class UserEvent(db.Model):
+    __tablename__ = 'user_events'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.Index('ix_user_events_user_id_id', 'user_id', 'id'),
+    )
+
+
 class ContentPage(db.Model):
     __tablename__ = 'content_pages'
     id = db.Column(db.Integer, primary_key=True)
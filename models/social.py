@@ -1,4 +1,5 @@
 from datetime import datetime
+from array import array
 import json
 from models.base import db
 
@@ -8,16 +9,16 @@ class Profile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
-    age = db.Column(db.Integer, nullable=False)
+    age = db.Column(db.Integer, nullable=False, index=True)
     bio = db.Column(db.Text)
     photo_url = db.Column(db.String(500))
     photos = db.Column(db.Text)
     religion = db.Column(db.String(50))
-    tribe = db.Column(db.String(50))
+    tribe = db.Column(db.String(50), index=True)
     profession = db.Column(db.String(100))
-    objective = db.Column(db.String(50))
+    objective = db.Column(db.String(50), index=True)
     interests = db.Column(db.Text)
-    location = db.Column(db.String(100))
+    location = db.Column(db.String(100), index=True)
     views_count = db.Column(db.Integer, default=0)
     weekly_views = db.Column(db.Text, default='[0,0,0,0,0,0,0]')
     is_verified = db.Column(db.Boolean, default=False)
@@ -41,7 +42,6 @@ class Profile(db.Model):
             'interests': self.interests,
             'location': self.location,
             'views_count': self.views_count,
-            'weekly_views': json.loads(self.weekly_views) if self.weekly_views else [0]*7,
             'is_verified': self.is_verified
         }
 
@@ -53,6 +53,10 @@ class Like(db.Model):
     receiver_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_match = db.Column(db.Boolean, default=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('sender_id', 'receiver_id', name='uq_likes_sender_receiver'),
+    )
 
 
 class Match(db.Model):
@@ -68,6 +72,15 @@ class Match(db.Model):
     user2 = db.relationship('User', foreign_keys=[user2_id])
     messages = db.relationship('Message', backref='match', cascade='all, delete-orphan')
     
+    __table_args__ = (
+        db.UniqueConstraint('user1_id', 'user2_id', name='uq_matches_pair'),
+        db.CheckConstraint('user1_id < user2_id', name='ck_matches_canonical_pair'),
+    )
+    
+    @staticmethod
+    def pair(user_a_id, user_b_id):
+        return (user_a_id, user_b_id) if user_a_id < user_b_id else (user_b_id, user_a_id)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -92,13 +105,129 @@ class Message(db.Model):
     
     sender = db.relationship('User')
     
-    def to_dict(self):
+    __table_args__ = (
+        db.Index('ix_messages_match_created_id', 'match_id', 'created_at', 'id'),
+    )
+    
+    def to_dict(self, sender_name=None, is_read=None):
+        if sender_name is None:
+            sender_name = self.sender.profile.name if self.sender.profile else 'Unknown'
+        if is_read is None:
+            is_read = self.is_read
         return {
             'id': self.id,
             'match_id': self.match_id,
             'sender_id': self.sender_id,
-            'sender_name': self.sender.profile.name if self.sender.profile else 'Unknown',
+            'sender_name': sender_name,
             'content': self.content,
             'created_at': self.created_at.isoformat(),
-            'is_read': self.is_read
+            'is_read': is_read
         }
+
+
+class DiscoverySeenSet(db.Model):
+    __tablename__ = 'discovery_seen_sets'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    seen_user_ids = db.Column(db.LargeBinary, nullable=False, default=b'')
+    size = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def get_ids(self):
+        ids = array('I')
+        ids.frombytes(self.seen_user_ids or b'')
+        return ids
+    
+    def set_ids(self, ids):
+        self.seen_user_ids = ids.tobytes()
+        self.size = len(ids)
+        self.updated_at = datetime.utcnow()
+
+
+class ProfilePass(db.Model):
+    __tablename__ = 'profile_passes'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    target_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_profile_passes_user_created', 'user_id', 'created_at'),
+    )
+
+
+class DiscoveryDeck(db.Model):
+    __tablename__ = 'discovery_decks'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    size = db.Column(db.Integer, default=0)
+    config_version = db.Column(db.String(64))
+    is_stale = db.Column(db.Boolean, default=False)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class DiscoveryDeckEntry(db.Model):
+    __tablename__ = 'discovery_deck_entries'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    profile_id = db.Column(db.Integer, db.ForeignKey('profiles.id'), primary_key=True)
+    profile_user_id = db.Column(db.Integer, nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_discovery_deck_entries_user_score', 'user_id', 'score'),
+    )
+
+
+class DiscoveryDeckUpdate(db.Model):
+    __tablename__ = 'discovery_deck_updates'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class ConversationSummary(db.Model):
+    __tablename__ = 'conversation_summaries'
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    other_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    last_message_id = db.Column(db.Integer)
+    last_message_sender_id = db.Column(db.Integer)
+    last_message_preview = db.Column(db.String(200))
+    last_message_at = db.Column(db.DateTime)
+    last_read_message_id = db.Column(db.Integer, default=0, nullable=False)
+    unread_count = db.Column(db.Integer, default=0)
+    match_created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_conversation_summaries_user_created', 'user_id', 'match_created_at'),
+    )
+
+
+class ProfileViewBucket(db.Model):
+    __tablename__ = 'profile_view_buckets'
+    profile_id = db.Column(db.Integer, db.ForeignKey('profiles.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    views = db.Column(db.Integer, default=0, nullable=False)
+
+
+class ProfileView(db.Model):
+    __tablename__ = 'profile_views'
+    viewed_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True, index=True)
+    viewer_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+
+
+class UserStats(db.Model):
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    match_count = db.Column(db.Integer, default=0, nullable=False)
+    message_count = db.Column(db.Integer, default=0, nullable=False)
+    likes_sent = db.Column(db.Integer, default=0, nullable=False)
+    likes_received = db.Column(db.Integer, default=0, nullable=False)
+    views = db.Column(db.Integer, default=0, nullable=False)
+    is_verified = db.Column(db.Boolean, default=False, nullable=False)
+    profile_complete = db.Column(db.Boolean, default=False, nullable=False)
+    location = db.Column(db.String(100))
+    xp = db.Column(db.Integer, default=0, nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_user_stats_location_xp', 'location', 'xp'),
+    )
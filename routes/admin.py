@@ -4,6 +4,10 @@ from models import db, User, Profile, AdminUser, Report, Subscription, TokenTran
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc
+from services.match_service import MatchService
+from services.deck_service import DeckService
+from utils.event_bus import EventBus
+from security.rate_limiter import rate_limiter
 import json
 
 admin = Blueprint('admin', __name__, url_prefix='/admin')
@@ -156,7 +160,8 @@ def users():
 @admin_required
 def user_detail(user_id):
     user = User.query.get_or_404(user_id)
-    matches = Match.query.filter(db.or_(Match.user1_id == user_id, Match.user2_id == user_id)).all()
+    from services.conversation_service import ConversationService
+    matches = ConversationService.matches_query(user_id).all()
     reports_received = Report.query.filter(Report.reported_user_id == user_id).all()
     reports_made = Report.query.filter(Report.reporter_id == user_id).all()
     transactions = TokenTransaction.query.filter(TokenTransaction.user_id == user_id).order_by(desc(TokenTransaction.created_at)).limit(20).all()
@@ -190,6 +195,8 @@ def user_action(user_id):
         if user.profile:
             user.profile.is_verified = True
             user.profile.verification_status = 'approved'
+            from services.user_stats_service import UserStatsService
+            UserStatsService.refresh_profile(user)
         log_action(admin_id, 'verify_user', 'user', user_id)
     elif action == 'add_tokens':
         amount = int(request.form.get('amount', 0))
@@ -215,6 +222,11 @@ def user_action(user_id):
         log_action(admin_id, 'remove_vip', 'user', user_id)
     
     db.session.commit()
+    
+    if action == 'ban':
+        DeckService.remove_user(user_id)
+    elif action == 'unban' and user.profile:
+        DeckService.queue_insert(user_id)
     return redirect(url_for('admin.user_detail', user_id=user_id))
 
 @admin.route('/moderation')
@@ -282,6 +294,9 @@ def report_detail(report_id):
             log_action(admin_id, 'start_review_report', 'report', report_id)
         
         db.session.commit()
+        
+        if action == 'resolve' and report.action_taken == 'ban_user' and report.reported_user_id:
+            DeckService.remove_user(report.reported_user_id)
         return redirect(url_for('admin.moderation'))
     
     admin_user = AdminUser.query.get(session['admin_id'])
@@ -304,6 +319,7 @@ def matching():
         )
         db.session.add(config)
         db.session.commit()
+        MatchService.invalidate_config_cache()
     
     stats = {
         'total_matches': Match.query.count(),
@@ -334,6 +350,7 @@ def update_matching():
     config.updated_at = datetime.utcnow()
     
     db.session.commit()
+    MatchService.invalidate_config_cache()
     log_action(session['admin_id'], 'update_matching_config', 'matching_config', config.id)
     
     return redirect(url_for('admin.matching'))
@@ -666,5 +683,8 @@ def api_stats():
         'users_today': User.query.filter(func.date(User.created_at) == today).count(),
         'matches_today': Match.query.filter(func.date(Match.created_at) == today).count(),
         'messages_today': Message.query.filter(func.date(Message.created_at) == today).count(),
-        'pending_reports': Report.query.filter(Report.status == 'pending').count()
+        'pending_reports': Report.query.filter(Report.status == 'pending').count(),
+        'matching_config_cache': MatchService.get_config_cache_stats(),
+        'event_bus': EventBus.stats(),
+        'rate_limiter': rate_limiter.stats()
     })
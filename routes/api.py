@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, current_app, Response, stream_with_context
 from models import db, User, Profile, Like, Match, Message, Notification, Report, PricingPlan
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import login_user, logout_user, login_required, current_user
@@ -8,6 +8,8 @@ from security.rate_limiter import rate_limiter
 
 api = Blueprint('api', __name__, url_prefix='/api')
 
+SWIPE_BATCH_MAX = 50
+
 @api.route('/auth/register', methods=['POST'])
 def register():
     ip = request.remote_addr
@@ -57,8 +59,15 @@ def register():
         objective=data.get('objective', 'Amitié')
     )
     db.session.add(profile)
+    db.session.flush()
+    
+    from services.user_stats_service import UserStatsService
+    UserStatsService.refresh_profile(user)
     db.session.commit()
     
+    from services.deck_service import DeckService
+    DeckService.queue_insert(user.id)
+    
     from services.notification_service import NotificationService
     NotificationService.send_welcome_notification(user)
     
@@ -131,7 +140,13 @@ def profile():
                 value = sanitize_input(value)
             setattr(profile, field, value)
     
+    from services.user_stats_service import UserStatsService
+    UserStatsService.refresh_profile(current_user)
     db.session.commit()
+    
+    from services.deck_service import DeckService
+    DeckService.mark_stale(current_user.id)
+    DeckService.refresh_profile(profile)
     return jsonify(profile.to_dict())
 
 @api.route('/profile/ghost-mode', methods=['POST'])
@@ -142,6 +157,12 @@ def toggle_ghost_mode():
     
     current_user.ghost_mode = not current_user.ghost_mode
     db.session.commit()
+    
+    from services.deck_service import DeckService
+    if current_user.ghost_mode:
+        DeckService.remove_user(current_user.id, keep_vip_viewers=True)
+    elif current_user.profile:
+        DeckService.queue_insert(current_user.id)
     return jsonify({'ghost_mode': current_user.ghost_mode})
 
 @api.route('/profile/verification', methods=['POST'])
@@ -163,11 +184,32 @@ def submit_verification():
 @api.route('/discovery')
 def get_discovery_profiles():
     from services.match_service import MatchService
-    if current_user.is_authenticated:
-        profiles = MatchService.get_discovery_profiles(current_user, limit=20)
-    else:
-        profiles = MatchService.get_public_profiles(limit=10)
-    return jsonify([p.to_dict() for p in profiles])
+    from services.deck_service import DeckService
+    if not current_user.is_authenticated:
+        deck = DeckService.get_guest_deck(request.remote_addr)
+        response = current_app.response_class(deck['body'], mimetype='application/json')
+        response.set_etag(deck['etag'], weak=True)
+        response.cache_control.public = True
+        response.cache_control.max_age = 0
+        response.cache_control.must_revalidate = True
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+    
+    profiles = DeckService.take(current_user, MatchService.DISCOVERY_PAGE_SIZE)
+    if profiles is not None:
+        response = jsonify([p.to_dict() for p in profiles])
+        response.headers['X-Discovery-Source'] = 'deck'
+        return response
+    
+    timings = {}
+    profiles = MatchService.get_discovery_profiles(current_user, timings=timings)
+    response = jsonify([p.to_dict() for p in profiles])
+    response.headers['X-Discovery-Source'] = 'live'
+    response.headers['Server-Timing'] = (
+        f"candidates;dur={timings['candidates']:.1f}, ranking;dur={timings['ranking']:.1f}"
+    )
+    response.headers['X-Candidate-Pool'] = str(timings['pool_size'])
+    return response
 
 @api.route('/discovery/swipe', methods=['POST'])
 @login_required
@@ -196,11 +238,42 @@ def swipe():
                 'compatibility_score': result.get('compatibility_score')
             })
     else:
-        target_profile.views_count = (target_profile.views_count or 0) + 1
+        from services.seen_set_service import SeenSetService
+        from services.view_count_service import ViewCountService
+        SeenSetService.record_pass(current_user.id, target_profile.user_id)
+        ViewCountService.record(target_profile, viewer=current_user)
         db.session.commit()
     
     return jsonify({'match': False})
 
+@api.route('/discovery/swipe/batch', methods=['POST'])
+@login_required
+def swipe_batch():
+    data = request.get_json() or {}
+    swipes = data.get('swipes') or []
+    
+    if not isinstance(swipes, list) or not swipes:
+        return jsonify({'error': 'Aucun swipe fourni'}), 400
+    if len(swipes) > SWIPE_BATCH_MAX:
+        return jsonify({'error': f'Maximum {SWIPE_BATCH_MAX} swipes par requête'}), 400
+    
+    try:
+        swipes = [{'profile_id': int(s['profile_id']), 'direction': s.get('direction')} for s in swipes]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Swipe invalide'}), 400
+    
+    identifier = f"{current_user.id}"
+    if rate_limiter.is_blocked(identifier, 'swipe'):
+        return jsonify({'error': "Trop de tentatives. Veuillez réessayer plus tard."}), 429
+    remaining = rate_limiter.get_remaining(identifier, 'swipe')
+    if remaining < len(swipes):
+        return jsonify({'error': 'Limite de swipes atteinte', 'remaining': remaining}), 429
+    rate_limiter.record_request(identifier, 'swipe', count=len(swipes))
+    
+    from services.match_service import MatchService
+    results = MatchService.process_swipes(current_user, swipes)
+    return jsonify({'results': results})
+
 @api.route('/matches')
 @login_required
 def get_matches():
@@ -215,14 +288,22 @@ def get_messages(match_id):
     if match.user1_id != current_user.id and match.user2_id != current_user.id:
         return jsonify({'error': 'Non autorisé'}), 403
     
-    messages = Message.query.filter_by(match_id=match_id).order_by(Message.created_at).all()
+    from services.conversation_service import ConversationService
+    before = None
+    if request.args.get('before'):
+        before = ConversationService.decode_cursor(request.args['before'])
+        if before is None:
+            return jsonify({'error': 'Curseur invalide'}), 400
     
-    Message.query.filter_by(match_id=match_id).filter(
-        Message.sender_id != current_user.id
-    ).update({'is_read': True})
+    messages, next_cursor = ConversationService.get_messages_page(
+        match_id, current_user.id, before=before, limit=request.args.get('limit', type=int)
+    )
     db.session.commit()
     
-    return jsonify([m.to_dict() for m in messages])
+    response = jsonify(messages)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 @api.route('/matches/<int:match_id>/messages', methods=['POST'])
 @login_required
@@ -253,6 +334,9 @@ def send_message(match_id):
         is_flagged=fraud_check['action'] == 'flag'
     )
     db.session.add(message)
+    
+    from services.conversation_service import ConversationService
+    ConversationService.record_message(message)
     db.session.commit()
     
     other_user = match.user2 if match.user1_id == current_user.id else match.user1
@@ -292,6 +376,9 @@ def greet_match(match_id):
         content="Bonjour ! Ravi de faire votre connaissance 👋"
     )
     db.session.add(message)
+    
+    from services.conversation_service import ConversationService
+    ConversationService.record_message(message)
     db.session.commit()
     
     return jsonify({
@@ -307,6 +394,38 @@ def get_likes_received():
     result = MatchService.get_likes_received(current_user)
     return jsonify(result)
 
+@api.route('/profile/viewers')
+@login_required
+def get_profile_viewers():
+    from services.view_count_service import ViewCountService
+    result = ViewCountService.get_recent_viewers(
+        current_user,
+        page=max(request.args.get('page', 1, type=int), 1),
+        per_page=request.args.get('per_page', type=int)
+    )
+    return jsonify(result)
+
+@api.route('/leaderboard')
+@login_required
+def get_leaderboard():
+    scope = request.args.get('scope', 'global')
+    if scope not in ('global', 'location'):
+        return jsonify({'error': 'Portée invalide'}), 400
+    
+    location = None
+    if scope == 'location':
+        location = current_user.profile.location if current_user.profile else None
+        if not location:
+            return jsonify({'error': 'Localisation requise'}), 400
+    
+    from services.leaderboard_service import LeaderboardService
+    result = LeaderboardService.get_leaderboard(
+        current_user,
+        limit=request.args.get('limit', type=int),
+        location=location
+    )
+    return jsonify(result)
+
 @api.route('/tokens/use', methods=['POST'])
 @login_required
 def use_token():
@@ -385,6 +504,30 @@ def cancel_subscription():
         return jsonify(result)
     return jsonify(result), 400
 
+@api.route('/stream')
+@login_required
+def event_stream():
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return jsonify({'error': 'Last-Event-ID invalide'}), 400
+    
+    from services.event_service import EventService
+    if not EventService.acquire_stream_slot():
+        response = Response(f"retry: {EventService.STREAM_BUSY_RETRY_MS}\n\n", status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(EventService.STREAM_BUSY_RETRY_MS // 1000)
+        return response
+    
+    response = Response(
+        stream_with_context(EventService.stream(current_user.id, last_event_id)),
+        mimetype='text/event-stream'
+    )
+    response.call_on_close(EventService.release_stream_slot)
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @api.route('/notifications')
 @login_required
 def get_notifications():
@@ -176,6 +176,9 @@ class FraudDetector:
             user.banned_at = datetime.utcnow()
             db.session.commit()
             
+            from services.deck_service import DeckService
+            DeckService.remove_user(user.id)
+            
             return True
         
         return False
@@ -0,0 +1,269 @@
+import sys
+import threading
+
+from sqlalchemy import BigInteger, Float, Integer, bindparam, case, create_engine, event, func, select, text
+
+from models import RateLimitCounter
+from utils.db import dialect_insert
+
+ALLOWED = None
+BLOCKED = 'blocked'
+LIMITED = 'limited'
+
+
+def _expiry(window_id, limits):
+    """Time after which a key holds no information: both windows are over and
+    any block set during them has ended."""
+    return (window_id + 2) * limits['window'] + limits['block_duration']
+
+
+def _estimate(window_id, current, previous, now, window):
+    now_id = int(now // window)
+    if window_id == now_id:
+        return previous * (1 - (now / window - now_id)) + current
+    if window_id == now_id - 1:
+        return current * (1 - (now / window - now_id))
+    return 0
+
+
+class _Window:
+    __slots__ = ('window_id', 'current', 'previous', 'blocked_until', 'expires_at')
+
+    def __init__(self, window_id):
+        self.window_id = window_id
+        self.current = 0
+        self.previous = 0
+        self.blocked_until = 0.0
+        self.expires_at = 0.0
+
+    def roll(self, window_id, limits):
+        if window_id != self.window_id:
+            self.previous = self.current if window_id == self.window_id + 1 else 0
+            self.current = 0
+            self.window_id = window_id
+        self.expires_at = _expiry(window_id, limits)
+
+
+class MemoryBackend:
+    """Per-process counters. Fast, but each worker enforces its own limits."""
+    name = 'memory'
+    SWEEP_BATCH = 1000
+
+    def __init__(self):
+        self.windows = {}
+        self.lock = threading.Lock()
+
+    def _window(self, key, limits, now):
+        window_id = int(now // limits['window'])
+        state = self.windows.get(key)
+        if state is None:
+            state = self.windows[key] = _Window(window_id)
+        state.roll(window_id, limits)
+        return state
+
+    def hit(self, key, limits, now):
+        with self.lock:
+            state = self._window(key, limits, now)
+            if now < state.blocked_until:
+                return BLOCKED
+            if _estimate(state.window_id, state.current, state.previous, now, limits['window']) >= limits['requests']:
+                state.blocked_until = now + limits['block_duration']
+                return LIMITED
+            state.current += 1
+        return ALLOWED
+
+    def record(self, key, limits, now, count):
+        with self.lock:
+            self._window(key, limits, now).current += count
+
+    def used(self, key, limits, now):
+        with self.lock:
+            state = self.windows.get(key)
+            if state is None:
+                return 0
+            return _estimate(state.window_id, state.current, state.previous, now, limits['window'])
+
+    def blocked_until(self, key):
+        with self.lock:
+            state = self.windows.get(key)
+            return state.blocked_until if state else 0.0
+
+    def reset(self, key):
+        with self.lock:
+            self.windows.pop(key, None)
+
+    def reset_identifier(self, identifier):
+        with self.lock:
+            keys_to_delete = [k for k in self.windows if k.endswith(f":{identifier}") or k.startswith(f"{identifier}:")]
+            for key in keys_to_delete:
+                del self.windows[key]
+
+    def sweep(self, now):
+        """Evict expired keys in batches, releasing the lock in between, and
+        rebuild the dict after a large eviction since dicts never shrink."""
+        with self.lock:
+            keys = list(self.windows)
+
+        evicted = 0
+        for start in range(0, len(keys), self.SWEEP_BATCH):
+            with self.lock:
+                for key in keys[start:start + self.SWEEP_BATCH]:
+                    state = self.windows.get(key)
+                    if state is not None and state.expires_at <= now:
+                        del self.windows[key]
+                        evicted += 1
+
+        with self.lock:
+            if evicted > len(self.windows):
+                self.windows = dict(self.windows)
+        return evicted
+
+    def stats(self, now):
+        with self.lock:
+            keys = list(self.windows)
+            blocked = sum(1 for state in self.windows.values() if state.blocked_until > now)
+            memory = sys.getsizeof(self.windows)
+
+        if keys:
+            memory += sum(sys.getsizeof(key) for key in keys) + len(keys) * sys.getsizeof(_Window(0))
+        return {'keys': len(keys), 'blocked': blocked, 'memory_bytes': memory}
+
+
+class SqlBackend:
+    """Counters in the rate_limit_counters table, shared by every process using
+    the same database. A check is a single INSERT ... ON CONFLICT DO UPDATE that
+    rolls the window, compares the estimate and either counts the request or
+    sets the block, so concurrent workers cannot both slip under the limit.
+    Statements are built once and only their parameters change per call."""
+
+    def __init__(self, engine, name):
+        self.engine = engine
+        self.name = name
+        self.table = RateLimitCounter.__table__
+        self.table.create(engine, checkfirst=True)
+        self.hit_statement, self.record_statement = self._build_statements()
+
+    def _build_statements(self):
+        table = self.table
+        window_id = bindparam('b_window_id', type_=BigInteger)
+        previous = case(
+            (table.c.window_id == window_id, table.c.previous),
+            (table.c.window_id == bindparam('b_previous_id', type_=BigInteger), table.c.current),
+            else_=0
+        )
+        current = case((table.c.window_id == window_id, table.c.current), else_=0)
+        insert = dialect_insert(self.engine, table).values(
+            key=bindparam('b_key'),
+            window_id=window_id,
+            current=bindparam('b_count', type_=Integer),
+            previous=0,
+            blocked_until=0.0,
+            expires_at=bindparam('b_expires_at', type_=Float)
+        )
+        rolled = {
+            'window_id': insert.excluded.window_id,
+            'previous': previous,
+            'expires_at': insert.excluded.expires_at
+        }
+
+        blocked = table.c.blocked_until > bindparam('b_now', type_=Float)
+        over = previous * bindparam('b_weight', type_=Float) + current >= bindparam('b_requests', type_=Integer)
+        hit = insert.on_conflict_do_update(index_elements=['key'], set_={
+            **rolled,
+            'current': case((blocked | over, current), else_=current + 1),
+            'blocked_until': case((~blocked & over, bindparam('b_block_until', type_=Float)), else_=table.c.blocked_until)
+        }).returning(table.c.blocked_until)
+        record = insert.on_conflict_do_update(index_elements=['key'], set_={
+            **rolled,
+            'current': current + insert.excluded.current
+        })
+        return hit, record
+
+    def _params(self, key, limits, now, count):
+        window_id = int(now // limits['window'])
+        return {
+            'b_key': key,
+            'b_window_id': window_id,
+            'b_previous_id': window_id - 1,
+            'b_count': count,
+            'b_expires_at': _expiry(window_id, limits)
+        }
+
+    def hit(self, key, limits, now):
+        params = self._params(key, limits, now, 1)
+        block_until = now + limits['block_duration']
+        params.update(
+            b_now=now,
+            b_weight=1 - (now / limits['window'] - params['b_window_id']),
+            b_requests=limits['requests'],
+            b_block_until=block_until
+        )
+        with self.engine.begin() as conn:
+            blocked_until = conn.execute(self.hit_statement, params).scalar()
+
+        if blocked_until <= now:
+            return ALLOWED
+        # RETURNING only sees the new row, so a block set at this very instant
+        # by another request is reported as LIMITED; either way it is refused.
+        return LIMITED if blocked_until == block_until else BLOCKED
+
+    def record(self, key, limits, now, count):
+        with self.engine.begin() as conn:
+            conn.execute(self.record_statement, self._params(key, limits, now, count))
+
+    def used(self, key, limits, now):
+        table = self.table
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(table.c.window_id, table.c.current, table.c.previous).where(table.c.key == key)
+            ).first()
+        return _estimate(row.window_id, row.current, row.previous, now, limits['window']) if row else 0
+
+    def blocked_until(self, key):
+        table = self.table
+        with self.engine.connect() as conn:
+            return conn.execute(select(table.c.blocked_until).where(table.c.key == key)).scalar() or 0.0
+
+    def reset(self, key):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.key == key))
+
+    def reset_identifier(self, identifier):
+        key = self.table.c.key
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(
+                key.endswith(f":{identifier}", autoescape=True) | key.startswith(f"{identifier}:", autoescape=True)
+            ))
+
+    def sweep(self, now):
+        with self.engine.begin() as conn:
+            return conn.execute(self.table.delete().where(self.table.c.expires_at <= now)).rowcount
+
+    def stats(self, now):
+        table = self.table
+        with self.engine.connect() as conn:
+            keys, blocked = conn.execute(select(
+                func.count(),
+                func.coalesce(func.sum(case((table.c.blocked_until > now, 1), else_=0)), 0)
+            )).one()
+            if self.engine.dialect.name == 'postgresql':
+                size = conn.execute(text("SELECT pg_total_relation_size('rate_limit_counters')")).scalar()
+            elif self.engine.dialect.name == 'sqlite':
+                size = conn.execute(text('PRAGMA page_count')).scalar() * conn.execute(text('PRAGMA page_size')).scalar()
+            else:
+                size = None
+        return {'keys': keys, 'blocked': blocked, 'storage_bytes': size}
+
+
+def sqlite_engine(path):
+    """Engine on a local SQLite file shared by the workers of one host."""
+    engine = create_engine(f'sqlite:///{path}', connect_args={'timeout': 10, 'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    return engine
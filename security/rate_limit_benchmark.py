@@ -0,0 +1,80 @@
+"""Per-check latency of the rate limit backends.
+
+    python -m security.rate_limit_benchmark --checks 20000 --keys 1000 --threads 4
+
+The postgres backend is measured when --database-url (or DATABASE_URL) points
+to PostgreSQL.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine
+
+from security.rate_limit_backends import MemoryBackend, SqlBackend, sqlite_engine
+
+LIMITS = {'requests': 100, 'window': 60, 'block_duration': 60}
+
+
+def run(backend, checks, keys, threads):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(offset):
+        local = []
+        for i in range(checks // threads):
+            key = f"bench:{(offset + i * threads) % keys}"
+            started = time.perf_counter()
+            backend.hit(key, LIMITS, time.time())
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'mean_us': statistics.fmean(latencies) * 1e6,
+        'p50_us': latencies[len(latencies) // 2] * 1e6,
+        'p99_us': latencies[int(len(latencies) * 0.99)] * 1e6,
+        'checks_per_s': len(latencies) / elapsed
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-check latency of the rate limit backends')
+    parser.add_argument('--checks', type=int, default=20000)
+    parser.add_argument('--keys', type=int, default=1000)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args()
+
+    backends = [MemoryBackend()]
+    sqlite_dir = tempfile.TemporaryDirectory()
+    backends.append(SqlBackend(sqlite_engine(os.path.join(sqlite_dir.name, 'bench.sqlite3')), 'sqlite'))
+    if args.database_url and args.database_url.startswith('postgres'):
+        engine = create_engine(args.database_url.replace('postgres://', 'postgresql://', 1))
+        backend = SqlBackend(engine, 'postgres')
+        backend.reset_identifier('bench')
+        backends.append(backend)
+
+    print(f"{'backend':<10}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'checks/s':>12}")
+    for backend in backends:
+        result = run(backend, args.checks, args.keys, args.threads)
+        print(f"{backend.name:<10}{result['mean_us']:>10.1f}{result['p50_us']:>10.1f}{result['p99_us']:>10.1f}{result['checks_per_s']:>12.0f}")
+        if backend.name == 'postgres':
+            backend.reset_identifier('bench')
+    sqlite_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,21 @@
-from datetime import datetime, timedelta
-from collections import defaultdict
+import logging
+import os
+import tempfile
 import threading
+import time
+
+from security.rate_limit_backends import MemoryBackend, SqlBackend, sqlite_engine, BLOCKED, LIMITED
+
+logger = logging.getLogger('shida.rate_limiter')
 
 class RateLimiter:
+    BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    SQLITE_PATH = os.environ.get('RATE_LIMIT_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'shida_rate_limits.sqlite3'))
+    SWEEP_INTERVAL = int(os.environ.get('RATE_LIMIT_SWEEP_INTERVAL', 60))
+
     _instance = None
     _lock = threading.Lock()
-    
+
     def __new__(cls):
         if cls._instance is None:
             with cls._lock:
@@ -13,11 +23,15 @@ class RateLimiter:
                     cls._instance = super().__new__(cls)
                     cls._instance._init_storage()
         return cls._instance
-    
+
     def _init_storage(self):
-        self.requests = defaultdict(list)
-        self.blocked = {}
-        
+        self.backend = MemoryBackend()
+        self.fallback = self.backend
+        self.failing = False
+        self.sweeper = None
+        self.evicted = 0
+        self.sweeps = 0
+
         self.limits = {
             'login': {'requests': 5, 'window': 300, 'block_duration': 900},
             'register': {'requests': 3, 'window': 3600, 'block_duration': 3600},
@@ -27,67 +41,101 @@ class RateLimiter:
             'api': {'requests': 200, 'window': 60, 'block_duration': 300},
             'default': {'requests': 60, 'window': 60, 'block_duration': 300}
         }
-    
+
+    def configure(self, backend=None, engine=None):
+        """Select where counters live: 'memory' (per process), 'sqlite' (a file
+        shared by the workers of one host) or 'postgres' (the application
+        database, shared by every node). engine is the application engine."""
+        backend = backend or self.BACKEND
+        if backend == 'sqlite':
+            self.backend = SqlBackend(sqlite_engine(self.SQLITE_PATH), 'sqlite')
+        elif backend == 'postgres':
+            self.backend = SqlBackend(engine, 'postgres')
+        elif backend == 'memory':
+            self.backend = self.fallback
+        else:
+            raise ValueError(f"Unknown rate limit backend: {backend}")
+        return self.backend
+
+    def _call(self, method, *args):
+        if self.sweeper is None:
+            self._start_sweeper()
+        try:
+            result = getattr(self.backend, method)(*args)
+        except Exception:
+            if self.backend is self.fallback:
+                raise
+            if not self.failing:
+                logger.exception("Rate limit backend %s failed, using in-memory counters", self.backend.name)
+                self.failing = True
+            return getattr(self.fallback, method)(*args)
+        self.failing = False
+        return result
+
     def _get_key(self, identifier, action):
         return f"{action}:{identifier}"
-    
-    def _clean_old_requests(self, key, window):
-        now = datetime.utcnow()
-        cutoff = now - timedelta(seconds=window)
-        self.requests[key] = [t for t in self.requests[key] if t > cutoff]
-    
+
+    def _get_limits(self, action):
+        return self.limits.get(action, self.limits['default'])
+
     def is_blocked(self, identifier, action='default'):
-        key = self._get_key(identifier, action)
-        
-        if key in self.blocked:
-            if datetime.utcnow() < self.blocked[key]:
-                return True
-            else:
-                del self.blocked[key]
-        
-        return False
-    
+        return time.time() < self._call('blocked_until', self._get_key(identifier, action))
+
     def check_rate_limit(self, identifier, action='default'):
-        if self.is_blocked(identifier, action):
+        limits = self._get_limits(action)
+        outcome = self._call('hit', self._get_key(identifier, action), limits, time.time())
+
+        if outcome == BLOCKED:
             return False, "Trop de tentatives. Veuillez réessayer plus tard."
-        
-        limits = self.limits.get(action, self.limits['default'])
-        key = self._get_key(identifier, action)
-        
-        self._clean_old_requests(key, limits['window'])
-        
-        if len(self.requests[key]) >= limits['requests']:
-            self.blocked[key] = datetime.utcnow() + timedelta(seconds=limits['block_duration'])
+        if outcome == LIMITED:
             return False, f"Limite atteinte. Réessayez dans {limits['block_duration'] // 60} minutes."
-        
-        self.requests[key].append(datetime.utcnow())
         return True, None
-    
-    def record_request(self, identifier, action='default'):
-        key = self._get_key(identifier, action)
-        self.requests[key].append(datetime.utcnow())
-    
+
+    def record_request(self, identifier, action='default', count=1):
+        self._call('record', self._get_key(identifier, action), self._get_limits(action), time.time(), count)
+
     def get_remaining(self, identifier, action='default'):
-        limits = self.limits.get(action, self.limits['default'])
-        key = self._get_key(identifier, action)
-        
-        self._clean_old_requests(key, limits['window'])
-        
-        return max(0, limits['requests'] - len(self.requests[key]))
-    
+        limits = self._get_limits(action)
+        used = self._call('used', self._get_key(identifier, action), limits, time.time())
+        return max(0, limits['requests'] - int(used))
+
     def reset(self, identifier, action=None):
         if action:
-            key = self._get_key(identifier, action)
-            if key in self.requests:
-                del self.requests[key]
-            if key in self.blocked:
-                del self.blocked[key]
+            self._call('reset', self._get_key(identifier, action))
         else:
-            keys_to_delete = [k for k in self.requests.keys() if k.endswith(f":{identifier}") or k.startswith(f"{identifier}:")]
-            for key in keys_to_delete:
-                if key in self.requests:
-                    del self.requests[key]
-                if key in self.blocked:
-                    del self.blocked[key]
+            self._call('reset_identifier', identifier)
+
+    def _start_sweeper(self):
+        with self._lock:
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(target=self._sweep_loop, name='rate-limit-sweeper', daemon=True)
+                self.sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.SWEEP_INTERVAL)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Rate limit sweep failed")
+
+    def sweep(self):
+        """Evict keys whose windows have both expired and that are not blocked.
+        Such keys would estimate to zero anyway, so nothing is forgotten."""
+        now = time.time()
+        evicted = self.backend.sweep(now)
+        if self.backend is not self.fallback:
+            evicted += self.fallback.sweep(now)
+        self.evicted += evicted
+        self.sweeps += 1
+        return evicted
+
+    def stats(self):
+        return {
+            'backend': self.backend.name,
+            **self._call('stats', time.time()),
+            'evicted': self.evicted,
+            'sweeps': self.sweeps
+        }
 
 rate_limiter = RateLimiter()
@@ -5,6 +5,12 @@ from services.gamification_service import GamificationService
 from services.verification_service import VerificationService
 from services.subscription_service import SubscriptionService
 from services.report_service import ReportService
+from services.compatibility_engine import CompatibilityEngine
+from services.seen_set_service import SeenSetService
+from services.deck_service import DeckService
+from services.conversation_service import ConversationService
+from services.event_service import EventService
+from services.leaderboard_service import LeaderboardService
 
 __all__ = [
     'MatchService',
@@ -13,5 +19,11 @@ __all__ = [
     'GamificationService',
     'VerificationService',
     'SubscriptionService',
-    'ReportService'
+    'ReportService',
+    'CompatibilityEngine',
+    'SeenSetService',
+    'DeckService',
+    'ConversationService',
+    'EventService',
+    'LeaderboardService'
 ]
@@ -0,0 +1,131 @@
+import json
+import numpy as np
+
+
+class CompatibilityEngine:
+    """Batch version of MatchService.calculate_compatibility.
+
+    Profiles are encoded into integer category codes and interest bitmasks so
+    one viewer can be scored against a whole candidate pool in a few array
+    operations. Scores are bit-for-bit identical to the per-pair function:
+    terms are added in the same order and rounding is done with Python's
+    round().
+    """
+    AGE_STEPS = ((2, 100), (5, 75), (10, 50), (15, 25))
+    FIELDS = ('objective', 'religion', 'location', 'tribe', 'profession')
+
+    @staticmethod
+    def parse_interests(raw):
+        if not raw:
+            return None
+        try:
+            return set(json.loads(raw)) if isinstance(raw, str) else set(raw.split(','))
+        except Exception:
+            return None
+
+    @staticmethod
+    def encode(profiles):
+        n = len(profiles)
+        codes = {field: np.zeros(n, dtype=np.int32) for field in CompatibilityEngine.FIELDS}
+        vocabularies = {field: {} for field in CompatibilityEngine.FIELDS}
+        ages = np.zeros(n, dtype=np.int64)
+        interest_sets = []
+        interest_vocab = {}
+
+        for i, profile in enumerate(profiles):
+            for field in CompatibilityEngine.FIELDS:
+                value = getattr(profile, field)
+                if value:
+                    vocab = vocabularies[field]
+                    codes[field][i] = vocab.setdefault(value, len(vocab) + 1)
+            ages[i] = profile.age or 0
+
+            interests = CompatibilityEngine.parse_interests(profile.interests)
+            interest_sets.append(interests)
+            if interests:
+                for item in interests:
+                    interest_vocab.setdefault(item, len(interest_vocab))
+
+        words = max(1, (len(interest_vocab) + 63) // 64)
+        bits = np.zeros((n, words), dtype=np.uint64)
+        has_interests = np.zeros(n, dtype=bool)
+        for i, interests in enumerate(interest_sets):
+            if not interests:
+                continue
+            has_interests[i] = True
+            for item in interests:
+                index = interest_vocab[item]
+                bits[i, index // 64] |= np.uint64(1 << (index % 64))
+
+        return {
+            'codes': codes,
+            'objectives': vocabularies['objective'],
+            'ages': ages,
+            'bits': bits,
+            'has_interests': has_interests
+        }
+
+    @staticmethod
+    def score(viewer, candidates, config):
+        if not viewer or not candidates:
+            return [0.0] * len(candidates)
+
+        from services.match_service import MatchService
+
+        features = CompatibilityEngine.encode([viewer] + list(candidates))
+        codes = {field: values[1:] for field, values in features['codes'].items()}
+        mine = {field: values[0] for field, values in features['codes'].items()}
+        total = np.zeros(len(candidates), dtype=np.float64)
+
+        objective_weight = config['objective_weight']
+        if mine['objective']:
+            compatible = np.zeros(len(features['objectives']) + 1, dtype=bool)
+            viewer_objective = viewer.objective
+            for objective, code in features['objectives'].items():
+                compatible[code] = MatchService._objectives_compatible(viewer_objective, objective)
+            other = codes['objective']
+            total += np.where(
+                other == mine['objective'], objective_weight * 100,
+                np.where((other > 0) & compatible[other], objective_weight * 50, 0.0)
+            )
+
+        if mine['religion']:
+            total += np.where(codes['religion'] == mine['religion'], config['religion_weight'] * 100, 0.0)
+
+        if mine['location']:
+            location_weight = config['location_weight']
+            same_location = codes['location'] == mine['location']
+            same_tribe = (codes['location'] > 0) & (codes['tribe'] == mine['tribe']) if mine['tribe'] else False
+            total += np.where(
+                same_location, location_weight * 100,
+                np.where(same_tribe, location_weight * 50, 0.0)
+            )
+
+        if mine['profession']:
+            total += np.where(codes['profession'] == mine['profession'], config['profession_weight'] * 100, 0.0)
+
+        viewer_age = features['ages'][0]
+        if viewer_age:
+            ages = features['ages'][1:]
+            diff = np.abs(ages - viewer_age)
+            age_weight = config['age_weight']
+            steps = [(ages != 0) & (diff <= limit) for limit, _ in CompatibilityEngine.AGE_STEPS]
+            total += np.select(steps, [age_weight * points for _, points in CompatibilityEngine.AGE_STEPS], 0.0)
+
+        if features['has_interests'][0]:
+            bits = features['bits']
+            common = np.bitwise_count(bits[1:] & bits[0]).sum(axis=1, dtype=np.int64)
+            union = np.bitwise_count(bits[1:] | bits[0]).sum(axis=1, dtype=np.int64)
+            valid = features['has_interests'][1:]
+            ratio = common / np.where(valid, union, 1)
+            total += np.where(valid, config['interests_weight'] * (ratio * 100), 0.0)
+
+        return [min(round(value, 2), 100.0) for value in total.tolist()]
+
+    @staticmethod
+    def rank(viewer, candidates, config, limit=None):
+        scores = CompatibilityEngine.score(viewer, candidates, config)
+        order = np.argsort(-np.asarray(scores, dtype=np.float64), kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        return [(candidates[i], scores[i]) for i in order.tolist()]
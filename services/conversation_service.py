@@ -0,0 +1,232 @@
+from models import db, Profile, Match, Message, ConversationSummary
+from services.event_service import EventService
+from services.user_stats_service import UserStatsService
+from sqlalchemy.orm import aliased
+from datetime import datetime
+import base64
+import os
+
+class ConversationService:
+    PREVIEW_LENGTH = 200
+    MESSAGE_PAGE_SIZE = int(os.environ.get('MESSAGE_PAGE_SIZE', 50))
+    MESSAGE_PAGE_MAX = 200
+    
+    @staticmethod
+    def open_conversation(match):
+        ConversationService._add_summaries(match)
+        for user_id, other_user_id in ((match.user1_id, match.user2_id), (match.user2_id, match.user1_id)):
+            EventService.publish(user_id, 'match_created', {
+                'match_id': match.id,
+                'other_user_id': other_user_id,
+                'compatibility_score': match.compatibility_score,
+                'created_at': match.created_at.isoformat()
+            })
+    
+    @staticmethod
+    def _add_summaries(match):
+        db.session.flush()
+        db.session.add_all([
+            ConversationSummary(
+                match_id=match.id,
+                user_id=user_id,
+                other_user_id=other_user_id,
+                match_created_at=match.created_at
+            )
+            for user_id, other_user_id in ((match.user1_id, match.user2_id), (match.user2_id, match.user1_id))
+        ])
+    
+    @staticmethod
+    def record_message(message):
+        db.session.flush()
+        ConversationSummary.query.filter_by(match_id=message.match_id).update({
+            'last_message_id': message.id,
+            'last_message_sender_id': message.sender_id,
+            'last_message_preview': message.content[:ConversationService.PREVIEW_LENGTH],
+            'last_message_at': message.created_at,
+            'unread_count': ConversationSummary.unread_count + db.case(
+                (ConversationSummary.user_id != message.sender_id, 1), else_=0
+            )
+        }, synchronize_session=False)
+        
+        UserStatsService.increment({message.sender_id: {'message_count': 1}})
+        
+        match = message.match
+        recipient_id = match.user2_id if message.sender_id == match.user1_id else match.user1_id
+        EventService.publish(recipient_id, 'message_created', message.to_dict(is_read=False))
+    
+    @staticmethod
+    def mark_read(match_id, reader_id, up_to_message_id):
+        still_unread = db.session.query(db.func.count(Message.id)).filter(
+            Message.match_id == match_id,
+            Message.sender_id != reader_id,
+            Message.id > up_to_message_id
+        ).scalar_subquery()
+        return ConversationSummary.query.filter(
+            ConversationSummary.match_id == match_id,
+            ConversationSummary.user_id == reader_id,
+            ConversationSummary.last_read_message_id < up_to_message_id
+        ).update({
+            'last_read_message_id': up_to_message_id,
+            'unread_count': still_unread
+        }, synchronize_session=False)
+    
+    @staticmethod
+    def get_watermarks(match_id):
+        return dict(db.session.query(
+            ConversationSummary.user_id, ConversationSummary.last_read_message_id
+        ).filter(ConversationSummary.match_id == match_id))
+    
+    @staticmethod
+    def refresh_preview(message):
+        ConversationSummary.query.filter_by(
+            match_id=message.match_id,
+            last_message_id=message.id
+        ).update({
+            'last_message_preview': message.content[:ConversationService.PREVIEW_LENGTH]
+        }, synchronize_session=False)
+    
+    @staticmethod
+    def encode_cursor(message):
+        raw = f"{message.created_at.isoformat()}|{message.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, message_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(message_id)
+        except (ValueError, UnicodeDecodeError):
+            return None
+    
+    @staticmethod
+    def get_messages_page(match_id, reader_id, before=None, limit=None):
+        limit = max(1, min(limit or ConversationService.MESSAGE_PAGE_SIZE, ConversationService.MESSAGE_PAGE_MAX))
+        query = Message.query.filter(Message.match_id == match_id)
+        if before:
+            created_at, message_id = before
+            query = query.filter(db.or_(
+                Message.created_at < created_at,
+                db.and_(Message.created_at == created_at, Message.id < message_id)
+            ))
+        
+        rows = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        page = list(reversed(rows[:limit]))
+        
+        watermarks = ConversationService.get_watermarks(match_id)
+        if page and before is None and page[-1].id > watermarks.get(reader_id, 0):
+            if ConversationService.mark_read(match_id, reader_id, page[-1].id):
+                watermarks[reader_id] = page[-1].id
+        
+        sender_ids = {message.sender_id for message in page}
+        names = dict(db.session.query(Profile.user_id, Profile.name).filter(
+            Profile.user_id.in_(sender_ids)
+        )) if sender_ids else {}
+        
+        messages = []
+        for message in page:
+            recipient_watermark = max(
+                (mark for user_id, mark in watermarks.items() if user_id != message.sender_id), default=0
+            )
+            messages.append(message.to_dict(
+                sender_name=names.get(message.sender_id, 'Unknown'),
+                is_read=message.id <= recipient_watermark
+            ))
+        next_cursor = ConversationService.encode_cursor(page[0]) if has_more else None
+        return messages, next_cursor
+    
+    @staticmethod
+    def matches_query(user_id):
+        return Match.query.join(
+            ConversationSummary, ConversationSummary.match_id == Match.id
+        ).filter(ConversationSummary.user_id == user_id)
+    
+    @staticmethod
+    def list_for_user(user):
+        other_profile = aliased(Profile)
+        other_summary = aliased(ConversationSummary)
+        rows = db.session.query(
+            ConversationSummary, Match.compatibility_score, other_profile, other_summary.last_read_message_id
+        ).join(
+            Match, Match.id == ConversationSummary.match_id
+        ).outerjoin(
+            other_profile, other_profile.user_id == ConversationSummary.other_user_id
+        ).outerjoin(
+            other_summary, db.and_(
+                other_summary.match_id == ConversationSummary.match_id,
+                other_summary.user_id == ConversationSummary.other_user_id
+            )
+        ).filter(
+            ConversationSummary.user_id == user.id,
+            Match.is_active == True
+        ).order_by(ConversationSummary.match_created_at.desc()).all()
+        
+        my_name = user.profile.name if user.profile else 'Unknown'
+        result = []
+        for summary, compatibility_score, other, other_watermark in rows:
+            last_message = None
+            if summary.last_message_id:
+                if summary.last_message_sender_id == user.id:
+                    sender_name = my_name
+                    is_read = summary.last_message_id <= (other_watermark or 0)
+                else:
+                    sender_name = other.name if other else 'Unknown'
+                    is_read = summary.last_message_id <= (summary.last_read_message_id or 0)
+                last_message = {
+                    'id': summary.last_message_id,
+                    'match_id': summary.match_id,
+                    'sender_id': summary.last_message_sender_id,
+                    'sender_name': sender_name,
+                    'content': summary.last_message_preview,
+                    'created_at': summary.last_message_at.isoformat(),
+                    'is_read': is_read
+                }
+            
+            result.append({
+                'id': summary.match_id,
+                'other_user': other.to_dict() if other else None,
+                'last_message': last_message,
+                'unread_count': summary.unread_count,
+                'compatibility_score': compatibility_score,
+                'created_at': summary.match_created_at.isoformat()
+            })
+        
+        return result
+    
+    @staticmethod
+    def backfill():
+        missing = Match.query.filter(
+            ~db.session.query(ConversationSummary.match_id).filter(
+                ConversationSummary.match_id == Match.id
+            ).exists()
+        ).all()
+        
+        for match in missing:
+            ConversationService._add_summaries(match)
+            last_message = Message.query.filter_by(match_id=match.id).order_by(
+                Message.created_at.desc(), Message.id.desc()
+            ).first()
+            if not last_message:
+                continue
+            
+            for user_id in (match.user1_id, match.user2_id):
+                unread_count = Message.query.filter_by(match_id=match.id, is_read=False).filter(
+                    Message.sender_id != user_id
+                ).count()
+                last_read_message_id = db.session.query(db.func.max(Message.id)).filter(
+                    Message.match_id == match.id,
+                    Message.sender_id != user_id,
+                    Message.is_read == True
+                ).scalar() or 0
+                ConversationSummary.query.filter_by(match_id=match.id, user_id=user_id).update({
+                    'last_message_id': last_message.id,
+                    'last_message_sender_id': last_message.sender_id,
+                    'last_message_preview': last_message.content[:ConversationService.PREVIEW_LENGTH],
+                    'last_message_at': last_message.created_at,
+                    'last_read_message_id': last_read_message_id,
+                    'unread_count': unread_count
+                }, synchronize_session=False)
+        
+        db.session.commit()
+        return len(missing)
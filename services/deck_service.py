@@ -0,0 +1,314 @@
+from models import db, User, Profile, Like, ProfilePass, DiscoveryDeck, DiscoveryDeckEntry, DiscoveryDeckUpdate
+from services.match_service import MatchService
+from services.compatibility_engine import CompatibilityEngine
+from services.seen_set_service import SeenSetService
+from utils.db import insert_ignore
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('shida.deck_service')
+
+class DeckService:
+    DECK_SIZE = int(os.environ.get('DISCOVERY_DECK_SIZE', 200))
+    DECK_LOW_WATERMARK = int(os.environ.get('DISCOVERY_DECK_LOW_WATERMARK', 20))
+    DECK_MAX_AGE_HOURS = int(os.environ.get('DISCOVERY_DECK_MAX_AGE_HOURS', 24))
+    ACTIVE_USER_DAYS = int(os.environ.get('DISCOVERY_ACTIVE_USER_DAYS', 14))
+    INCREMENTAL_FANOUT = int(os.environ.get('DISCOVERY_INCREMENTAL_FANOUT', 5000))
+    
+    GUEST_DECK_COUNT = int(os.environ.get('DISCOVERY_GUEST_DECK_COUNT', 4))
+    GUEST_DECK_SIZE = int(os.environ.get('DISCOVERY_GUEST_DECK_SIZE', 10))
+    GUEST_DECK_ROTATION = int(os.environ.get('DISCOVERY_GUEST_DECK_ROTATION', 180))
+    
+    _guest_lock = threading.Lock()
+    _guest_decks = {'epoch': None, 'decks': []}
+
+    @classmethod
+    def get_guest_deck(cls, client_key):
+        epoch = int(time.time() // cls.GUEST_DECK_ROTATION)
+        with cls._guest_lock:
+            if cls._guest_decks['epoch'] != epoch:
+                cls._guest_decks = {'epoch': epoch, 'decks': cls._build_guest_decks(epoch)}
+            decks = cls._guest_decks['decks']
+        
+        digest = hashlib.sha1(str(client_key).encode()).digest()
+        return decks[int.from_bytes(digest[:4], 'big') % len(decks)]
+    
+    @staticmethod
+    def _build_guest_decks(epoch):
+        """Decks are sampled with the epoch as seed, so every worker and instance
+        serves the same profiles for a rotation. The ETag is derived from the
+        epoch and profile ids rather than the body, whose view counts can differ
+        slightly between processes."""
+        size = DeckService.GUEST_DECK_SIZE
+        profiles = MatchService.get_seeded_public_profiles(size * DeckService.GUEST_DECK_COUNT, epoch)
+        decks = []
+        for index in range(DeckService.GUEST_DECK_COUNT):
+            deck = [profiles[(index * size + i) % len(profiles)] for i in range(min(size, len(profiles)))]
+            key = f"{epoch}:{index}:{','.join(str(profile.id) for profile in deck)}"
+            decks.append({
+                'etag': hashlib.sha1(key.encode()).hexdigest(),
+                'body': json.dumps([profile.to_dict() for profile in deck]).encode()
+            })
+        return decks
+    
+    @staticmethod
+    def build_deck(user):
+        ranked = []
+        if user.profile:
+            candidates = MatchService.generate_candidates(user)
+            config = MatchService.get_active_config()
+            ranked = CompatibilityEngine.rank(user.profile, candidates, config, limit=DeckService.DECK_SIZE)
+
+        DiscoveryDeckEntry.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+        if ranked:
+            db.session.execute(DiscoveryDeckEntry.__table__.insert(), [
+                {'user_id': user.id, 'profile_id': row.id, 'profile_user_id': row.user_id, 'score': score}
+                for row, score in ranked
+            ])
+
+        deck = db.session.get(DiscoveryDeck, user.id) or DiscoveryDeck(user_id=user.id)
+        deck.size = len(ranked)
+        deck.config_version = MatchService.get_config_version()
+        deck.is_stale = False
+        deck.built_at = datetime.utcnow()
+        db.session.add(deck)
+        db.session.commit()
+        return deck.size
+
+    @staticmethod
+    def take(user, limit):
+        deck = db.session.get(DiscoveryDeck, user.id)
+        if not deck or deck.is_stale or not deck.size:
+            return None
+        if deck.config_version != MatchService.get_config_version():
+            DeckService.mark_stale(user.id)
+            return None
+
+        profiles = Profile.query.join(
+            DiscoveryDeckEntry,
+            db.and_(DiscoveryDeckEntry.profile_id == Profile.id, DiscoveryDeckEntry.user_id == user.id)
+        ).order_by(DiscoveryDeckEntry.score.desc(), DiscoveryDeckEntry.profile_id.desc()).limit(limit).all()
+        if not profiles:
+            return None
+
+        removed = DiscoveryDeckEntry.query.filter(
+            DiscoveryDeckEntry.user_id == user.id,
+            DiscoveryDeckEntry.profile_id.in_([profile.id for profile in profiles])
+        ).delete(synchronize_session=False)
+        DeckService._shrink(deck, removed)
+        db.session.commit()
+        return profiles
+
+    @staticmethod
+    def discard(user_id, target_user_ids):
+        removed = DiscoveryDeckEntry.query.filter(
+            DiscoveryDeckEntry.user_id == user_id,
+            DiscoveryDeckEntry.profile_user_id.in_(target_user_ids)
+        ).delete(synchronize_session=False)
+        if removed:
+            DeckService._shrink(db.session.get(DiscoveryDeck, user_id), removed)
+        return removed
+
+    @staticmethod
+    def _shrink(deck, removed):
+        if deck and removed:
+            deck.size = max(0, (deck.size or 0) - removed)
+            if deck.size < DeckService.DECK_LOW_WATERMARK:
+                deck.is_stale = True
+
+    @staticmethod
+    def mark_stale(user_id):
+        DiscoveryDeck.query.filter_by(user_id=user_id).update({'is_stale': True})
+        db.session.commit()
+
+    @staticmethod
+    def users_needing_refresh(limit=500):
+        active_since = datetime.utcnow() - timedelta(days=DeckService.ACTIVE_USER_DAYS)
+        built_before = datetime.utcnow() - timedelta(hours=DeckService.DECK_MAX_AGE_HOURS)
+        rows = db.session.query(User.id).outerjoin(
+            DiscoveryDeck, DiscoveryDeck.user_id == User.id
+        ).filter(
+            User.is_active == True,
+            User.is_banned == False,
+            User.last_login >= active_since,
+            db.or_(
+                DiscoveryDeck.user_id == None,
+                DiscoveryDeck.is_stale == True,
+                DiscoveryDeck.config_version != MatchService.get_config_version(),
+                DiscoveryDeck.built_at < built_before
+            )
+        ).order_by(User.last_login.desc()).limit(limit)
+        return [user_id for (user_id,) in rows]
+
+    @staticmethod
+    def queue_insert(user_id):
+        """Hand insert_profile to the deck worker: scoring up to
+        INCREMENTAL_FANOUT viewers does not belong in the request that
+        changed the profile. Repeated requests for a user coalesce."""
+        db.session.execute(
+            insert_ignore(db.session, DiscoveryDeckUpdate.__table__, ['user_id']),
+            {'user_id': user_id, 'created_at': datetime.utcnow()}
+        )
+        db.session.commit()
+
+    @staticmethod
+    def apply_queued_inserts(limit=200):
+        user_ids = [user_id for (user_id,) in db.session.query(DiscoveryDeckUpdate.user_id).order_by(
+            DiscoveryDeckUpdate.created_at
+        ).limit(limit).with_for_update(skip_locked=True)]
+        if not user_ids:
+            return 0
+        DiscoveryDeckUpdate.query.filter(DiscoveryDeckUpdate.user_id.in_(user_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+        inserted = 0
+        for user_id in user_ids:
+            profile = Profile.query.filter_by(user_id=user_id).first()
+            if not profile:
+                continue
+            try:
+                inserted += DeckService.insert_profile(profile)
+            except Exception:
+                db.session.rollback()
+                logger.exception("Deck insert failed for user %s", user_id)
+        return inserted
+
+    @staticmethod
+    def insert_profile(profile):
+        user = profile.user
+        if not user or user.is_banned or not user.is_active or not profile.is_approved:
+            return 0
+
+        viewers = DeckService._bucket_viewers(profile, vip_only=user.ghost_mode)
+        if not viewers:
+            return 0
+
+        viewer_ids = [viewer.user_id for viewer in viewers]
+        already_seen = {sender_id for (sender_id,) in db.session.query(Like.sender_id).filter(
+            Like.sender_id.in_(viewer_ids), Like.receiver_id == profile.user_id
+        )}
+        pass_cutoff = datetime.utcnow() - timedelta(days=SeenSetService.PASS_TTL_DAYS)
+        already_seen |= {viewer_id for (viewer_id,) in db.session.query(ProfilePass.user_id).filter(
+            ProfilePass.user_id.in_(viewer_ids),
+            ProfilePass.target_id == profile.user_id,
+            ProfilePass.created_at > pass_cutoff
+        )}
+        viewers = [viewer for viewer in viewers if viewer.user_id not in already_seen]
+        if not viewers:
+            return 0
+
+        config = MatchService.get_active_config()
+        scores = CompatibilityEngine.score(profile, viewers, config)
+
+        floors = DeckService._floor_entries([viewer.user_id for viewer in viewers])
+
+        rows = []
+        grown = []
+        evicted = []
+        for viewer, score in zip(viewers, scores):
+            floor = floors.get(viewer.user_id)
+            if (viewer.deck_size or 0) < DeckService.DECK_SIZE or floor is None:
+                grown.append(viewer.user_id)
+            elif score > floor[1]:
+                evicted.append({'b_user_id': viewer.user_id, 'b_profile_id': floor[0]})
+            else:
+                continue
+            rows.append({
+                'user_id': viewer.user_id,
+                'profile_id': profile.id,
+                'profile_user_id': profile.user_id,
+                'score': score
+            })
+
+        if evicted:
+            entries = DiscoveryDeckEntry.__table__
+            db.session.execute(entries.delete().where(
+                entries.c.user_id == db.bindparam('b_user_id'),
+                entries.c.profile_id == db.bindparam('b_profile_id')
+            ), evicted)
+        if rows:
+            db.session.execute(DiscoveryDeckEntry.__table__.insert(), rows)
+        if grown:
+            DiscoveryDeck.query.filter(DiscoveryDeck.user_id.in_(grown)).update(
+                {'size': DiscoveryDeck.size + 1}, synchronize_session=False
+            )
+        db.session.commit()
+        return len(rows)
+
+    @staticmethod
+    def _floor_entries(viewer_ids):
+        """Lowest-ranked entry (profile_id, score) of each viewer's deck, in take() order."""
+        ranked = db.session.query(
+            DiscoveryDeckEntry.user_id,
+            DiscoveryDeckEntry.profile_id,
+            DiscoveryDeckEntry.score,
+            db.func.row_number().over(
+                partition_by=DiscoveryDeckEntry.user_id,
+                order_by=(DiscoveryDeckEntry.score, DiscoveryDeckEntry.profile_id)
+            ).label('position')
+        ).filter(DiscoveryDeckEntry.user_id.in_(viewer_ids)).subquery()
+        rows = db.session.query(ranked.c.user_id, ranked.c.profile_id, ranked.c.score).filter(ranked.c.position == 1)
+        return {user_id: (profile_id, score) for user_id, profile_id, score in rows}
+
+    @staticmethod
+    def _bucket_viewers(profile, vip_only=False):
+        buckets = []
+        if profile.objective:
+            buckets.append(Profile.objective.in_(MatchService._objective_bucket(profile.objective)))
+        if profile.location:
+            buckets.append(Profile.location == profile.location)
+        if profile.tribe:
+            buckets.append(Profile.tribe == profile.tribe)
+        if profile.age:
+            band = MatchService.DISCOVERY_AGE_BAND
+            buckets.append(Profile.age.between(profile.age - band, profile.age + band))
+        if not buckets:
+            return []
+
+        query = db.session.query(*MatchService.SCORING_COLUMNS, DiscoveryDeck.size.label('deck_size')).join(
+            DiscoveryDeck, DiscoveryDeck.user_id == Profile.user_id
+        ).join(User, User.id == Profile.user_id).filter(
+            Profile.user_id != profile.user_id,
+            DiscoveryDeck.is_stale == False,
+            db.or_(*buckets),
+            ~db.session.query(DiscoveryDeckEntry.user_id).filter(
+                DiscoveryDeckEntry.user_id == Profile.user_id,
+                DiscoveryDeckEntry.profile_id == profile.id
+            ).exists()
+        )
+        if vip_only:
+            query = query.filter(User.is_vip == True)
+        return query.limit(DeckService.INCREMENTAL_FANOUT).all()
+
+    @staticmethod
+    def remove_user(user_id, keep_vip_viewers=False):
+        """Runs after the ban or ghosting is committed: a failure here is logged
+        and leaves the entries to the next deck rebuild."""
+        try:
+            query = DiscoveryDeckEntry.query.filter(DiscoveryDeckEntry.profile_user_id == user_id)
+            if keep_vip_viewers:
+                vip_ids = db.session.query(User.id).filter(User.is_vip == True)
+                query = query.filter(~DiscoveryDeckEntry.user_id.in_(vip_ids))
+
+            viewer_ids = [entry.user_id for entry in query.with_entities(DiscoveryDeckEntry.user_id)]
+            if viewer_ids:
+                query.delete(synchronize_session=False)
+                DiscoveryDeck.query.filter(DiscoveryDeck.user_id.in_(viewer_ids)).update(
+                    {'size': DiscoveryDeck.size - 1}, synchronize_session=False
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception("Deck removal failed for user %s", user_id)
+            return 0
+        return len(viewer_ids)
+
+    @staticmethod
+    def refresh_profile(profile):
+        DeckService.remove_user(profile.user_id)
+        DeckService.queue_insert(profile.user_id)
@@ -0,0 +1,96 @@
+from models import db, UserEvent
+from utils.event_bus import EventBus
+from datetime import datetime, timedelta
+import json
+import os
+import threading
+import time
+
+class EventService:
+    STREAM_POLL_INTERVAL = float(os.environ.get('EVENT_STREAM_POLL_INTERVAL', 15))
+    STREAM_HEARTBEAT = int(os.environ.get('EVENT_STREAM_HEARTBEAT', 15))
+    STREAM_MAX_DURATION = int(os.environ.get('EVENT_STREAM_MAX_DURATION', 300))
+    STREAM_MAX_CONCURRENT = int(os.environ.get('EVENT_STREAM_MAX_CONCURRENT', 24))
+    STREAM_RETRY_MS = 3000
+    STREAM_BUSY_RETRY_MS = 10000
+    STREAM_BATCH_SIZE = 100
+    EVENT_TTL_HOURS = int(os.environ.get('EVENT_TTL_HOURS', 24))
+
+    _stream_slots = threading.BoundedSemaphore(STREAM_MAX_CONCURRENT)
+
+    @staticmethod
+    def publish(user_id, event_type, payload):
+        event = UserEvent(user_id=user_id, event_type=event_type, payload=json.dumps(payload))
+        db.session.add(event)
+        EventBus.publish(db.session, user_id)
+        return event
+
+    @staticmethod
+    def latest_id(user_id):
+        return db.session.query(db.func.max(UserEvent.id)).filter(UserEvent.user_id == user_id).scalar() or 0
+
+    @staticmethod
+    def events_since(user_id, last_id, limit=None):
+        return db.session.query(UserEvent.id, UserEvent.event_type, UserEvent.payload).filter(
+            UserEvent.user_id == user_id,
+            UserEvent.id > last_id
+        ).order_by(UserEvent.id).limit(limit or EventService.STREAM_BATCH_SIZE).all()
+
+    @staticmethod
+    def format_event(event_id, event_type, payload):
+        return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n"
+
+    @staticmethod
+    def acquire_stream_slot():
+        """Each open stream holds a server thread, so only STREAM_MAX_CONCURRENT
+        run at once per process and the remaining threads keep serving requests."""
+        return EventService._stream_slots.acquire(blocking=False)
+
+    @staticmethod
+    def release_stream_slot():
+        EventService._stream_slots.release()
+
+    @staticmethod
+    def stream(user_id, last_event_id=None):
+        yield f"retry: {EventService.STREAM_RETRY_MS}\n\n"
+
+        EventBus.start(db.engine)
+        waiter = EventBus.subscribe(user_id)
+        try:
+            if last_event_id is None:
+                last_event_id = EventService.latest_id(user_id)
+            db.session.remove()
+
+            started = last_sent = time.monotonic()
+            while True:
+                remaining = EventService.STREAM_MAX_DURATION - (time.monotonic() - started)
+                if remaining <= 0:
+                    break
+
+                waiter.clear()
+                events = EventService.events_since(user_id, last_event_id)
+                db.session.remove()
+
+                for event_id, event_type, payload in events:
+                    yield EventService.format_event(event_id, event_type, payload)
+                    last_event_id = event_id
+
+                if events:
+                    last_sent = time.monotonic()
+                    if len(events) == EventService.STREAM_BATCH_SIZE:
+                        continue
+                elif time.monotonic() - last_sent >= EventService.STREAM_HEARTBEAT:
+                    yield ": heartbeat\n\n"
+                    last_sent = time.monotonic()
+
+                heartbeat_due = EventService.STREAM_HEARTBEAT - (time.monotonic() - last_sent)
+                waiter.wait(max(0.0, min(EventService.STREAM_POLL_INTERVAL, heartbeat_due, remaining)))
+        finally:
+            EventBus.unsubscribe(user_id, waiter)
+
+    @staticmethod
+    def purge_expired():
+        cutoff = datetime.utcnow() - timedelta(hours=EventService.EVENT_TTL_HOURS)
+        removed = UserEvent.query.filter(UserEvent.created_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return removed
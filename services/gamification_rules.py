@@ -0,0 +1,161 @@
+from bisect import bisect_right
+from types import MappingProxyType
+
+DEFAULT_LEVEL = MappingProxyType({'level': 1, 'name': 'Nouveau', 'min_xp': 0, 'color': '#9E9E9E'})
+
+XP_REWARD_DEFAULTS = MappingProxyType({
+    'profile_view': 1,
+    'match': 25,
+    'message_sent': 5,
+    'verification': 100,
+    'profile_complete': 50
+})
+
+XP_COUNTERS = (
+    ('views', 'profile_view'),
+    ('match_count', 'match'),
+    ('message_count', 'message_sent')
+)
+
+
+def _is_verified(user):
+    return bool(user.profile and user.profile.is_verified)
+
+
+BADGE_PREDICATES = (
+    ('verified', lambda user, stats, completion: _is_verified(user)),
+    ('vip_gold', lambda user, stats, completion: bool(user.is_vip) and user.vip_type == 'Gold'),
+    ('vip_platinum', lambda user, stats, completion: bool(user.is_vip) and user.vip_type == 'Platinum'),
+    ('popular', lambda user, stats, completion: stats.views >= 100),
+    ('match_master', lambda user, stats, completion: stats.match_count >= 10),
+    ('profile_complete', lambda user, stats, completion: completion >= 100),
+)
+
+
+def _count_evaluator(counter):
+    def compile_requirement(requirement):
+        target = requirement.get('count', 1)
+
+        def evaluate(user, stats, completion):
+            count = getattr(stats, counter)
+            return min(count / target * 100, 100), count >= target
+        return evaluate
+    return compile_requirement
+
+
+def _completion_evaluator(requirement):
+    target = requirement.get('percentage', 100)
+
+    def evaluate(user, stats, completion):
+        return min(completion / target * 100, 100), completion >= target
+    return evaluate
+
+
+def _verification_evaluator(requirement):
+    def evaluate(user, stats, completion):
+        verified = _is_verified(user)
+        return (100 if verified else 0), verified
+    return evaluate
+
+
+def _unknown_evaluator(requirement):
+    def evaluate(user, stats, completion):
+        return 0, False
+    return evaluate
+
+
+ACHIEVEMENT_EVALUATORS = {
+    'matches': _count_evaluator('match_count'),
+    'messages_sent': _count_evaluator('message_count'),
+    'profile_completion': _completion_evaluator,
+    'verification': _verification_evaluator,
+}
+
+
+class GamificationRules:
+    """Immutable, pre-compiled form of data/gamification.json.
+
+    Levels are sorted once for bisect lookups, badges become an ordered list
+    of predicates and achievements are bound to an evaluator for their
+    requirement type. Evaluation only reads the user, its profile, the
+    user_stats record and the profile completion.
+    """
+    __slots__ = ('config', 'levels', 'thresholds', 'badges', 'achievements', 'xp_rewards')
+
+    def __init__(self, config):
+        self.config = MappingProxyType(config)
+        self.levels = tuple(MappingProxyType(dict(level)) for level in sorted(
+            config.get('levels', []), key=lambda level: level['min_xp']
+        ))
+        self.thresholds = tuple(level['min_xp'] for level in self.levels)
+
+        badge_defs = {badge['id']: badge for badge in config.get('badges', [])}
+        self.badges = tuple(
+            (MappingProxyType(dict(badge_defs[badge_id])), predicate)
+            for badge_id, predicate in BADGE_PREDICATES if badge_id in badge_defs
+        )
+
+        self.achievements = tuple(
+            (MappingProxyType(dict(achievement)), ACHIEVEMENT_EVALUATORS.get(
+                achievement.get('requirement', {}).get('type'), _unknown_evaluator
+            )(achievement.get('requirement', {})))
+            for achievement in config.get('achievements', [])
+        )
+        self.xp_rewards = MappingProxyType(dict(config.get('xp_rewards', {})))
+
+    def badges_for(self, user, stats, completion):
+        return [dict(badge) for badge, predicate in self.badges if predicate(user, stats, completion)]
+
+    def reward(self, name):
+        return self.xp_rewards.get(name, XP_REWARD_DEFAULTS[name])
+
+    def counter_xp(self, counts):
+        return sum(counts.get(counter, 0) * self.reward(name) for counter, name in XP_COUNTERS)
+
+    def bonus_xp(self, is_verified, is_complete):
+        xp = self.reward('verification') if is_verified else 0
+        if is_complete:
+            xp += self.reward('profile_complete')
+        return xp
+
+    def xp_for(self, user, stats, completion):
+        xp = sum(getattr(stats, counter) * self.reward(name) for counter, name in XP_COUNTERS)
+        return xp + self.bonus_xp(_is_verified(user), completion >= 100)
+
+    def level_for(self, xp):
+        index = bisect_right(self.thresholds, xp)
+        if not self.levels:
+            current_level = DEFAULT_LEVEL
+        else:
+            current_level = self.levels[max(index - 1, 0)]
+        next_level = self.levels[index] if index < len(self.levels) else None
+
+        if next_level:
+            current_min = current_level['min_xp']
+            span = next_level['min_xp'] - current_min
+            progress = int((xp - current_min) / span * 100) if span > 0 else 0
+        else:
+            progress = 100
+
+        return {
+            'current': dict(current_level),
+            'next': dict(next_level) if next_level else None,
+            'xp': xp,
+            'progress': progress
+        }
+
+    def achievements_for(self, user, stats, completion):
+        completed = []
+        pending = []
+        for achievement, evaluate in self.achievements:
+            progress, is_completed = evaluate(user, stats, completion)
+            achievement_data = {
+                **achievement,
+                'progress': int(progress),
+                'is_completed': is_completed
+            }
+            if is_completed:
+                completed.append(achievement_data)
+            else:
+                pending.append(achievement_data)
+        return {'completed': completed, 'pending': pending}
@@ -0,0 +1,117 @@
+from models import db, User, Profile, UserStats
+from services.user_stats_service import UserStatsService
+from array import array
+from bisect import bisect_right
+import os
+import threading
+import time
+
+class RankIndex:
+    """Sorted XP histogram answering "how many users score above x" in O(log n).
+
+    Built from `SELECT xp, count(*) ... GROUP BY xp`, so its size is the number
+    of distinct scores rather than the number of users.
+    """
+    __slots__ = ('scores', 'at_most', 'total')
+
+    def __init__(self, histogram):
+        self.scores = array('q')
+        self.at_most = array('q', [0])
+        for score, count in sorted(histogram):
+            self.scores.append(score)
+            self.at_most.append(self.at_most[-1] + count)
+        self.total = self.at_most[-1]
+
+    def count_above(self, xp):
+        return self.total - self.at_most[bisect_right(self.scores, xp)]
+
+
+class LeaderboardService:
+    REFRESH_SECONDS = int(os.environ.get('LEADERBOARD_REFRESH_SECONDS', 300))
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    _lock = threading.Lock()
+    _indexes = {}
+
+    @staticmethod
+    def _ranked_users():
+        return db.session.query(UserStats).join(User, User.id == UserStats.user_id).filter(
+            User.is_banned == False,
+            User.ghost_mode == False
+        )
+
+    @classmethod
+    def _fresh(cls, location):
+        cached = cls._indexes.get(location)
+        if cached is not None and time.monotonic() - cached[0] < cls.REFRESH_SECONDS:
+            return cached[1]
+        return None
+
+    @classmethod
+    def get_index(cls, location=None):
+        """Rank index of the global scope (None) or of one location. A location
+        is only built when its ranks are asked for, from user_stats(location, xp),
+        and every scope is rebuilt at most every REFRESH_SECONDS."""
+        location = location or None
+        index = cls._fresh(location)
+        if index is not None:
+            return index
+
+        with cls._lock:
+            index = cls._fresh(location)
+            if index is not None:
+                return index
+            query = cls._ranked_users().with_entities(UserStats.xp, db.func.count())
+            if location:
+                query = query.filter(UserStats.location == location)
+            index = RankIndex(query.group_by(UserStats.xp).all())
+
+            now = time.monotonic()
+            indexes = {key: cached for key, cached in cls._indexes.items() if now - cached[0] < cls.REFRESH_SECONDS}
+            indexes[location] = (now, index)
+            cls._indexes = indexes
+        return index
+
+    @staticmethod
+    def get_top(limit=None, location=None):
+        from services.gamification_service import GamificationService
+        limit = max(1, min(limit or LeaderboardService.DEFAULT_LIMIT, LeaderboardService.MAX_LIMIT))
+        query = LeaderboardService._ranked_users().add_entity(Profile).join(
+            Profile, Profile.user_id == UserStats.user_id
+        )
+        if location:
+            query = query.filter(UserStats.location == location)
+        rows = query.order_by(UserStats.xp.desc(), UserStats.user_id).limit(limit).all()
+
+        rules = GamificationService.get_rules()
+        entries = []
+        for position, (stats, profile) in enumerate(rows, start=1):
+            rank = entries[-1]['rank'] if entries and entries[-1]['xp'] == stats.xp else position
+            entries.append({
+                'rank': rank,
+                'xp': stats.xp,
+                'level': rules.level_for(stats.xp)['current'],
+                'profile': profile.to_dict()
+            })
+        return entries
+
+    @staticmethod
+    def get_rank(user, location=None):
+        index = LeaderboardService.get_index(location)
+        xp = UserStatsService.get(user.id).xp
+        return {'rank': index.count_above(xp) + 1, 'xp': xp, 'total': max(index.total, 1)}
+
+    @staticmethod
+    def get_leaderboard(user, limit=None, location=None):
+        entries = LeaderboardService.get_top(limit, location)
+        me = LeaderboardService.get_rank(user, location)
+        for entry in entries:
+            if entry['profile']['user_id'] == user.id:
+                me['rank'] = entry['rank']
+        return {
+            'scope': 'location' if location else 'global',
+            'location': location,
+            'entries': entries,
+            'me': me
+        }
@@ -1,28 +1,127 @@
 from models import db, User, Profile, Like, Match, Message, MatchingConfig, Notification
+from services.compatibility_engine import CompatibilityEngine
+from services.seen_set_service import SeenSetService
+from services.conversation_service import ConversationService
+from services.view_count_service import ViewCountService
+from services.user_stats_service import UserStatsService
+from utils.cache import VersionStamp
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from utils.db import insert_ignore
 from datetime import datetime
 import json
+import os
+import random
+import threading
+import time
 
 class MatchService:
+    DEFAULT_CONFIG = {
+        'religion_weight': 0.20,
+        'location_weight': 0.15,
+        'objective_weight': 0.35,
+        'profession_weight': 0.10,
+        'age_weight': 0.15,
+        'interests_weight': 0.05
+    }
+    
+    _config_lock = threading.Lock()
+    _config_stamp = VersionStamp('matching_config')
+    _config_cache = None
+    _config_stats = {'hits': 0, 'misses': 0}
+    CONFIG_RECHECK_SECONDS = int(os.environ.get('MATCHING_CONFIG_RECHECK_SECONDS', 30))
+    
+    OBJECTIVE_GROUPS = [
+        {'Mariage', 'Mariage & Sérieux'},
+        {'Construction', 'Mariage'},
+        {'Amitié', 'Construction'}
+    ]
+    
+    DISCOVERY_PAGE_SIZE = int(os.environ.get('DISCOVERY_PAGE_SIZE', 20))
+    DISCOVERY_BUCKET_SIZE = int(os.environ.get('DISCOVERY_BUCKET_SIZE', 200))
+    DISCOVERY_CANDIDATE_POOL = int(os.environ.get('DISCOVERY_CANDIDATE_POOL', 800))
+    DISCOVERY_MAX_PAGES = int(os.environ.get('DISCOVERY_MAX_PAGES', 5))
+    DISCOVERY_AGE_BAND = 5
+    
+    PUBLIC_POOL_SIZE = int(os.environ.get('DISCOVERY_PUBLIC_POOL_SIZE', 2000))
+    PUBLIC_POOL_TTL = int(os.environ.get('DISCOVERY_PUBLIC_POOL_TTL', 300))
+    
+    _public_pool_lock = threading.Lock()
+    _public_pool = {'ids': [], 'cursor': 0, 'built_at': 0.0}
+    _public_random = random.Random()
+    
+    SCORING_COLUMNS = (
+        Profile.id, Profile.user_id, Profile.objective, Profile.religion, Profile.location,
+        Profile.tribe, Profile.profession, Profile.age, Profile.interests
+    )
+    
     @staticmethod
-    def get_active_config():
-        config = MatchingConfig.query.filter_by(is_active=True).first()
-        if not config:
+    def _config_version(config):
+        if config is None or config.updated_at is None:
+            return None
+        return config.updated_at.isoformat()
+    
+    @classmethod
+    def get_active_config(cls):
+        """Weights of the active MatchingConfig, cached per process. The file
+        stamp catches invalidations from workers of the same host at once; the
+        active row's updated_at is re-read every CONFIG_RECHECK_SECONDS so that
+        other instances pick up the change too."""
+        stamp = cls._config_stamp.read()
+        cached = cls._config_cache
+        if cached is not None and cached['stamp'] == stamp:
+            if time.monotonic() - cached['checked_at'] < cls.CONFIG_RECHECK_SECONDS:
+                with cls._config_lock:
+                    cls._config_stats['hits'] += 1
+                return cached['weights']
+            
+            current = db.session.query(MatchingConfig.updated_at).filter_by(is_active=True).first()
+            if cls._config_version(current) == cached['version']:
+                with cls._config_lock:
+                    cached['checked_at'] = time.monotonic()
+                    cls._config_stats['hits'] += 1
+                return cached['weights']
+        
+        with cls._config_lock:
+            cls._config_stats['misses'] += 1
+            config = MatchingConfig.query.filter_by(is_active=True).first()
+            weights = config.to_dict() if config else dict(cls.DEFAULT_CONFIG)
+            cls._config_cache = {
+                'stamp': stamp,
+                'version': cls._config_version(config),
+                'weights': weights,
+                'checked_at': time.monotonic()
+            }
+        return weights
+    
+    @classmethod
+    def invalidate_config_cache(cls):
+        cls._config_stamp.bump()
+        cls._config_cache = None
+    
+    @classmethod
+    def get_config_version(cls):
+        cls.get_active_config()
+        cached = cls._config_cache
+        return (cached['version'] if cached else None) or ''
+    
+    @classmethod
+    def get_config_cache_stats(cls):
+        cached = cls._config_cache
+        with cls._config_lock:
             return {
-                'religion_weight': 0.20,
-                'location_weight': 0.15,
-                'objective_weight': 0.35,
-                'profession_weight': 0.10,
-                'age_weight': 0.15,
-                'interests_weight': 0.05
+                'hits': cls._config_stats['hits'],
+                'misses': cls._config_stats['misses'],
+                'version': cached['version'] if cached else None
             }
-        return config.to_dict()
     
     @staticmethod
-    def calculate_compatibility(profile1, profile2):
+    def calculate_compatibility(profile1, profile2, config=None):
         if not profile1 or not profile2:
             return 0.0
         
-        config = MatchService.get_active_config()
+        if config is None:
+            config = MatchService.get_active_config()
         score = 0.0
         
         if profile1.objective and profile2.objective:
@@ -72,33 +171,45 @@ class MatchService:
     
     @staticmethod
     def _objectives_compatible(obj1, obj2):
-        compatible_groups = [
-            {'Mariage', 'Mariage & Sérieux'},
-            {'Construction', 'Mariage'},
-            {'Amitié', 'Construction'}
-        ]
-        for group in compatible_groups:
+        for group in MatchService.OBJECTIVE_GROUPS:
             if obj1 in group and obj2 in group:
                 return True
         return False
     
     @staticmethod
-    def get_discovery_profiles(user, limit=20):
-        liked_user_ids = [l.receiver_id for l in user.sent_likes]
-        liked_user_ids.append(user.id)
+    def _objective_bucket(objective):
+        bucket = {objective}
+        for group in MatchService.OBJECTIVE_GROUPS:
+            if objective in group:
+                bucket |= group
+        return bucket
+    
+    @staticmethod
+    def get_discovery_profiles(user, limit=None, timings=None):
+        limit = limit or MatchService.DISCOVERY_PAGE_SIZE
         
-        matched_user_ids = []
-        matches = Match.query.filter(
-            db.or_(Match.user1_id == user.id, Match.user2_id == user.id)
-        ).all()
-        for match in matches:
-            matched_user_ids.append(match.user1_id)
-            matched_user_ids.append(match.user2_id)
+        started = time.perf_counter()
+        candidates = MatchService.generate_candidates(user)
+        generated = time.perf_counter()
         
-        excluded_ids = set(liked_user_ids + matched_user_ids)
+        if user.profile:
+            config = MatchService.get_active_config()
+            ranked = CompatibilityEngine.rank(user.profile, candidates, config, limit=limit)
+            profile_ids = [row.id for row, score in ranked]
+        else:
+            profile_ids = [row.id for row in candidates[:limit]]
+        profiles = MatchService._load_profiles(profile_ids)
+        finished = time.perf_counter()
         
-        profiles = Profile.query.join(User).filter(
-            ~Profile.user_id.in_(excluded_ids),
+        if timings is not None:
+            timings['candidates'] = (generated - started) * 1000
+            timings['ranking'] = (finished - generated) * 1000
+            timings['pool_size'] = len(candidates)
+        return profiles
+    
+    @staticmethod
+    def _eligible_query(user):
+        query = db.session.query(*MatchService.SCORING_COLUMNS).join(User).filter(
             Profile.user_id != user.id,
             User.is_active == True,
             User.is_banned == False,
@@ -106,82 +217,155 @@ class MatchService:
         )
         
         if not user.is_vip:
-            profiles = profiles.filter(User.ghost_mode == False)
+            query = query.filter(User.ghost_mode == False)
+        return query
+    
+    @staticmethod
+    def generate_candidates(user, pool_size=None, bucket_size=None):
+        pool_size = pool_size or MatchService.DISCOVERY_CANDIDATE_POOL
+        bucket_size = bucket_size or MatchService.DISCOVERY_BUCKET_SIZE
+        eligible = MatchService._eligible_query(user)
+        seen = SeenSetService.get_seen(user.id)
         
-        profiles = profiles.limit(limit * 2).all()
+        buckets = []
+        profile = user.profile
+        if profile:
+            if profile.objective:
+                buckets.append(Profile.objective.in_(MatchService._objective_bucket(profile.objective)))
+            if profile.location:
+                buckets.append(Profile.location == profile.location)
+            if profile.tribe:
+                buckets.append(Profile.tribe == profile.tribe)
+            if profile.age:
+                band = MatchService.DISCOVERY_AGE_BAND
+                buckets.append(Profile.age.between(profile.age - band, profile.age + band))
         
-        if user.profile:
-            scored_profiles = []
-            for profile in profiles:
-                score = MatchService.calculate_compatibility(user.profile, profile)
-                scored_profiles.append((profile, score))
-            
-            scored_profiles.sort(key=lambda x: x[1], reverse=True)
-            return [p for p, s in scored_profiles[:limit]]
+        pool = {}
+        for condition in buckets:
+            if len(pool) >= pool_size:
+                break
+            MatchService._fill_pool(eligible.filter(condition), pool, seen, bucket_size, pool_size)
         
-        return profiles[:limit]
+        if len(pool) < pool_size:
+            MatchService._fill_pool(eligible, pool, seen, pool_size, pool_size)
+        
+        return list(pool.values())
+    
+    @staticmethod
+    def _fill_pool(query, pool, seen, quota, pool_size):
+        added = 0
+        last_id = None
+        for _ in range(MatchService.DISCOVERY_MAX_PAGES):
+            page = query if last_id is None else query.filter(Profile.id < last_id)
+            rows = page.order_by(Profile.id.desc()).limit(quota).all()
+            for row in rows:
+                if row.id in pool or row.user_id in seen:
+                    continue
+                pool[row.id] = row
+                added += 1
+                if added >= quota or len(pool) >= pool_size:
+                    return
+            if len(rows) < quota:
+                return
+            last_id = rows[-1].id
+    
+    @staticmethod
+    def _load_profiles(profile_ids):
+        if not profile_ids:
+            return []
+        profiles = {p.id: p for p in Profile.query.filter(Profile.id.in_(profile_ids)).all()}
+        return [profiles[pid] for pid in profile_ids if pid in profiles]
     
     @staticmethod
-    def get_public_profiles(limit=10):
-        profiles = Profile.query.join(User).filter(
+    def _public_filters():
+        return (
             User.is_active == True,
             User.is_banned == False,
             User.ghost_mode == False,
             Profile.is_approved == True
-        ).order_by(db.func.random()).limit(limit).all()
-        return profiles
+        )
+    
+    @classmethod
+    def get_public_profiles(cls, limit=10):
+        return cls._load_public_profiles(cls._take_public_ids(limit))
+    
+    @classmethod
+    def get_seeded_public_profiles(cls, size, seed):
+        """Uniform sample drawn identically by every process for the same seed."""
+        return cls._load_public_profiles(cls._sample_public_ids(size, random.Random(seed)))
+    
+    @classmethod
+    def _load_public_profiles(cls, profile_ids):
+        if not profile_ids:
+            return []
+        profiles = {p.id: p for p in Profile.query.join(User).filter(
+            Profile.id.in_(profile_ids), *cls._public_filters()
+        ).all()}
+        return [profiles[pid] for pid in profile_ids if pid in profiles]
+    
+    @classmethod
+    def _take_public_ids(cls, limit):
+        with cls._public_pool_lock:
+            pool = cls._public_pool
+            expired = time.monotonic() - pool['built_at'] > cls.PUBLIC_POOL_TTL
+            if not pool['ids'] or expired:
+                pool['ids'] = cls._sample_public_ids(cls.PUBLIC_POOL_SIZE)
+                pool['cursor'] = 0
+                pool['built_at'] = time.monotonic()
+            
+            ids = pool['ids']
+            if not ids:
+                return []
+            start = pool['cursor']
+            taken = [ids[(start + i) % len(ids)] for i in range(min(limit, len(ids)))]
+            pool['cursor'] = (start + len(taken)) % len(ids)
+            if start + len(taken) >= len(ids):
+                cls._public_random.shuffle(ids)
+            return taken
+    
+    @classmethod
+    def _sample_public_ids(cls, size, rng=None):
+        eligible = [pid for (pid,) in db.session.query(Profile.id).join(User).filter(
+            *cls._public_filters()
+        ).order_by(Profile.id)]
+        return (rng or cls._public_random).sample(eligible, min(size, len(eligible)))
     
     @staticmethod
     def process_like(sender, receiver_id):
-        receiver = User.query.get(receiver_id)
-        if not receiver or receiver.is_banned:
-            return {'success': False, 'error': 'User not found'}
-        
-        existing_like = Like.query.filter_by(
-            sender_id=sender.id,
-            receiver_id=receiver_id
-        ).first()
-        
-        if existing_like:
+        like_ids = MatchService._insert_likes(sender.id, [receiver_id])
+        if not like_ids:
+            receiver = db.session.get(User, receiver_id)
+            if not receiver or receiver.is_banned:
+                return {'success': False, 'error': 'User not found'}
             return {'success': False, 'error': 'Already liked'}
         
-        like = Like(sender_id=sender.id, receiver_id=receiver_id)
-        db.session.add(like)
+        receiver, mutual_like_id = db.session.query(User, Like.id).outerjoin(
+            Like, db.and_(Like.sender_id == User.id, Like.receiver_id == sender.id)
+        ).options(joinedload(User.profile)).filter(User.id == receiver_id).one()
         
+        SeenSetService.add(sender.id, [receiver_id])
         if receiver.profile:
-            receiver.profile.views_count += 1
-            weekly_views = json.loads(receiver.profile.weekly_views or '[0,0,0,0,0,0,0]')
-            day_index = datetime.now().weekday()
-            weekly_views[day_index] += 1
-            receiver.profile.weekly_views = json.dumps(weekly_views)
-        
-        mutual_like = Like.query.filter_by(
-            sender_id=receiver_id,
-            receiver_id=sender.id
-        ).first()
-        
-        if mutual_like:
-            like.is_match = True
-            mutual_like.is_match = True
+            ViewCountService.record(receiver.profile, viewer=sender)
+        
+        if mutual_like_id:
+            Like.query.filter(Like.id.in_([like_ids[receiver_id], mutual_like_id])).update(
+                {'is_match': True}, synchronize_session=False
+            )
             
             compatibility = MatchService.calculate_compatibility(sender.profile, receiver.profile)
-            match = Match(
-                user1_id=sender.id,
-                user2_id=receiver_id,
-                compatibility_score=compatibility
-            )
-            db.session.add(match)
+            match, created = MatchService._create_match(sender.id, receiver_id, compatibility)
             db.session.commit()
             
-            from services.notification_service import NotificationService
-            NotificationService.send_match_notification(sender, receiver)
-            NotificationService.send_match_notification(receiver, sender)
+            if created:
+                from services.notification_service import NotificationService
+                NotificationService.send_match_notification(sender, receiver)
+                NotificationService.send_match_notification(receiver, sender)
             
             return {
                 'success': True,
                 'match': True,
                 'match_id': match.id,
-                'compatibility_score': compatibility,
+                'compatibility_score': match.compatibility_score,
                 'match_data': match.to_dict()
             }
         
@@ -189,31 +373,110 @@ class MatchService:
         return {'success': True, 'match': False}
     
     @staticmethod
-    def get_user_matches(user):
-        matches = Match.query.filter(
-            db.or_(Match.user1_id == user.id, Match.user2_id == user.id),
-            Match.is_active == True
-        ).order_by(Match.created_at.desc()).all()
-        
-        result = []
-        for match in matches:
-            other_user = match.user2 if match.user1_id == user.id else match.user1
-            last_message = Message.query.filter_by(match_id=match.id).order_by(Message.created_at.desc()).first()
-            unread_count = Message.query.filter_by(
-                match_id=match.id,
-                is_read=False
-            ).filter(Message.sender_id != user.id).count()
+    def _insert_likes(sender_id, receiver_ids):
+        eligible = db.select(
+            db.literal(sender_id), User.id, db.literal(datetime.utcnow()), db.literal(False)
+        ).where(User.id.in_(receiver_ids), User.is_banned == False)
+        statement = insert_ignore(db.session, Like.__table__, ['sender_id', 'receiver_id']).from_select(
+            ['sender_id', 'receiver_id', 'created_at', 'is_match'], eligible
+        ).returning(Like.__table__.c.receiver_id, Like.__table__.c.id)
+        like_ids = dict(db.session.execute(statement).all())
+        
+        if like_ids:
+            deltas = {receiver_id: {'likes_received': 1} for receiver_id in like_ids}
+            deltas.setdefault(sender_id, {})['likes_sent'] = len(like_ids)
+            UserStatsService.increment(deltas)
+        return like_ids
+    
+    @staticmethod
+    def _create_match(user_a_id, user_b_id, compatibility_score):
+        user1_id, user2_id = Match.pair(user_a_id, user_b_id)
+        match = Match(user1_id=user1_id, user2_id=user2_id, compatibility_score=compatibility_score)
+        try:
+            with db.session.begin_nested():
+                db.session.add(match)
+                ConversationService.open_conversation(match)
+        except IntegrityError:
+            return Match.query.filter_by(user1_id=user1_id, user2_id=user2_id).first(), False
+        UserStatsService.increment({user1_id: {'match_count': 1}, user2_id: {'match_count': 1}})
+        return match, True
+    
+    @staticmethod
+    def process_swipes(sender, swipes):
+        profile_ids = {swipe['profile_id'] for swipe in swipes}
+        profiles = {p.id: p for p in Profile.query.filter(Profile.id.in_(profile_ids)).all()} if profile_ids else {}
+        
+        results = []
+        liked = {}
+        passed = []
+        for swipe in swipes:
+            profile = profiles.get(swipe['profile_id'])
+            if not profile:
+                results.append({'profile_id': swipe['profile_id'], 'error': 'Profil non trouvé'})
+                continue
             
-            result.append({
-                'id': match.id,
-                'other_user': other_user.profile.to_dict() if other_user.profile else None,
-                'last_message': last_message.to_dict() if last_message else None,
-                'unread_count': unread_count,
-                'compatibility_score': match.compatibility_score,
-                'created_at': match.created_at.isoformat()
-            })
+            results.append({'profile_id': profile.id, 'match': False})
+            if swipe['direction'] != 'right':
+                passed.append(profile.user_id)
+                ViewCountService.record(profile, viewer=sender)
+                continue
+            liked.setdefault(profile.user_id, profile)
         
-        return result
+        if passed:
+            SeenSetService.record_passes(sender.id, passed)
+        
+        matches = {}
+        created = set()
+        like_ids = MatchService._insert_likes(sender.id, list(liked)) if liked else {}
+        if like_ids:
+            for receiver_id in like_ids:
+                ViewCountService.record(liked[receiver_id], viewer=sender)
+            SeenSetService.add(sender.id, list(like_ids))
+            
+            mutual_likes = db.session.query(Like.id, Like.sender_id).filter(
+                Like.sender_id.in_(list(like_ids)),
+                Like.receiver_id == sender.id
+            ).all()
+            if mutual_likes:
+                mutual_ids = [receiver_id for _, receiver_id in mutual_likes]
+                Like.query.filter(Like.id.in_(
+                    [like_id for like_id, _ in mutual_likes] + [like_ids[uid] for uid in mutual_ids]
+                )).update({'is_match': True}, synchronize_session=False)
+                
+                config = MatchService.get_active_config()
+                scores = CompatibilityEngine.score(
+                    sender.profile, [liked[uid] for uid in mutual_ids], config
+                ) if sender.profile else [0.0] * len(mutual_ids)
+                for receiver_id, score in zip(mutual_ids, scores):
+                    match, is_new = MatchService._create_match(sender.id, receiver_id, score)
+                    matches[receiver_id] = match
+                    if is_new:
+                        created.add(receiver_id)
+        
+        db.session.commit()
+        
+        if matches:
+            from services.notification_service import NotificationService
+            for receiver_id in created:
+                receiver = liked[receiver_id].user
+                NotificationService.send_match_notification(sender, receiver)
+                NotificationService.send_match_notification(receiver, sender)
+            
+            match_by_profile = {liked[uid].id: match for uid, match in matches.items()}
+            for result in results:
+                match = match_by_profile.pop(result['profile_id'], None)
+                if match:
+                    result.update({
+                        'match': True,
+                        'match_data': match.to_dict(),
+                        'compatibility_score': match.compatibility_score
+                    })
+        
+        return results
+    
+    @staticmethod
+    def get_user_matches(user):
+        return ConversationService.list_for_user(user)
     
     @staticmethod
     def get_likes_received(user):
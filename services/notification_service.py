@@ -13,6 +13,13 @@ class NotificationService:
             action_url=action_url
         )
         db.session.add(notification)
+        db.session.flush()
+        
+        from services.event_service import EventService
+        EventService.publish(user_id, 'notification_created', {
+            'notification': notification.to_dict(),
+            'unread_count': Notification.query.filter_by(user_id=user_id, is_read=False).count()
+        })
         db.session.commit()
         return notification
     
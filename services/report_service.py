@@ -99,6 +99,9 @@ class ReportService:
             report.reported_message.content = "[Message supprimé par modération]"
             report.reported_message.is_flagged = True
             report.reported_message.flag_reason = f"Signalement #{report.id}"
+            
+            from services.conversation_service import ConversationService
+            ConversationService.refresh_preview(report.reported_message)
         
         log = AuditLog(
             admin_id=admin_id,
@@ -110,6 +113,10 @@ class ReportService:
         db.session.add(log)
         db.session.commit()
         
+        if action in ('temporary_ban', 'permanent_ban') and report.reported_user_id:
+            from services.deck_service import DeckService
+            DeckService.remove_user(report.reported_user_id)
+        
         return {'success': True, 'action_taken': action}
     
     @staticmethod
@@ -160,4 +167,8 @@ class ReportService:
         db.session.add(log)
         db.session.commit()
         
+        if user.profile:
+            from services.deck_service import DeckService
+            DeckService.queue_insert(user.id)
+        
         return {'success': True, 'message': 'Utilisateur débanni'}
@@ -0,0 +1,97 @@
+from models import db, Like, DiscoverySeenSet, ProfilePass, ConversationSummary
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+from array import array
+from bisect import bisect_left
+import os
+
+
+class SeenSet:
+    def __init__(self, ids, passed=None):
+        self.ids = ids
+        self.passed = passed or frozenset()
+    
+    def __contains__(self, user_id):
+        if user_id in self.passed:
+            return True
+        index = bisect_left(self.ids, user_id)
+        return index < len(self.ids) and self.ids[index] == user_id
+    
+    def __len__(self):
+        return len(self.ids) + len(self.passed)
+
+
+class SeenSetService:
+    PASS_TTL_DAYS = int(os.environ.get('DISCOVERY_PASS_TTL_DAYS', 14))
+    
+    @staticmethod
+    def get_seen(user_id):
+        row = db.session.get(DiscoverySeenSet, user_id)
+        if row is None:
+            row = SeenSetService._build(user_id)
+            db.session.commit()
+        return SeenSet(row.get_ids(), SeenSetService.get_recent_passes(user_id))
+    
+    @staticmethod
+    def record_pass(user_id, target_id):
+        SeenSetService.record_passes(user_id, [target_id])
+    
+    @staticmethod
+    def record_passes(user_id, target_ids):
+        db.session.add_all([ProfilePass(user_id=user_id, target_id=target_id) for target_id in target_ids])
+        
+        from services.deck_service import DeckService
+        DeckService.discard(user_id, target_ids)
+    
+    @staticmethod
+    def get_recent_passes(user_id):
+        cutoff = datetime.utcnow() - timedelta(days=SeenSetService.PASS_TTL_DAYS)
+        rows = db.session.query(ProfilePass.target_id).filter(
+            ProfilePass.user_id == user_id,
+            ProfilePass.created_at > cutoff
+        )
+        return frozenset(target_id for (target_id,) in rows)
+    
+    @staticmethod
+    def purge_expired_passes():
+        cutoff = datetime.utcnow() - timedelta(days=SeenSetService.PASS_TTL_DAYS)
+        deleted = ProfilePass.query.filter(ProfilePass.created_at <= cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    
+    @staticmethod
+    def add(user_id, target_ids):
+        row = DiscoverySeenSet.query.filter_by(user_id=user_id).with_for_update().first()
+        if row is None:
+            row = SeenSetService._build(user_id)
+        
+        ids = row.get_ids()
+        changed = False
+        for target_id in sorted(set(target_ids)):
+            index = bisect_left(ids, target_id)
+            if index < len(ids) and ids[index] == target_id:
+                continue
+            ids.insert(index, target_id)
+            changed = True
+        
+        if changed:
+            row.set_ids(ids)
+            
+            from services.deck_service import DeckService
+            DeckService.discard(user_id, target_ids)
+        return changed
+    
+    @staticmethod
+    def _build(user_id):
+        liked = db.session.query(Like.receiver_id).filter(Like.sender_id == user_id)
+        matched = db.session.query(ConversationSummary.other_user_id).filter(ConversationSummary.user_id == user_id)
+        seen = {uid for (uid,) in liked} | {uid for (uid,) in matched}
+        
+        row = DiscoverySeenSet(user_id=user_id)
+        row.set_ids(array('I', sorted(seen)))
+        try:
+            with db.session.begin_nested():
+                db.session.add(row)
+        except IntegrityError:
+            row = db.session.get(DiscoverySeenSet, user_id)
+        return row
@@ -0,0 +1,155 @@
+from models import db, User, Profile, Like, Message, ConversationSummary, UserStats
+from utils.db import dialect_insert, insert_ignore
+from utils.memo import request_memoized
+from services.gamification_rules import XP_COUNTERS
+from datetime import datetime
+import logging
+import threading
+
+logger = logging.getLogger('shida.user_stats')
+
+def _get_rules():
+    from services.gamification_service import GamificationService
+    return GamificationService.get_rules()
+
+class UserStatsService:
+    COUNTERS = ('match_count', 'message_count', 'likes_sent', 'likes_received', 'views')
+    XP_LOCK_KEY = 720432
+
+    @staticmethod
+    @request_memoized
+    def get(user_id):
+        stats = db.session.get(UserStats, user_id)
+        if stats is None:
+            stats = UserStats(user_id=user_id, **UserStatsService._empty_row())
+        return stats
+
+    @staticmethod
+    def _empty_row():
+        row = {counter: 0 for counter in UserStatsService.COUNTERS}
+        row.update(xp=0, is_verified=False, profile_complete=False, location=None)
+        return row
+
+    @staticmethod
+    def xp_expression(rules):
+        table = UserStats.__table__
+        xp = sum(table.c[counter] * rules.reward(name) for counter, name in XP_COUNTERS)
+        return (
+            xp
+            + db.case((table.c.is_verified, rules.reward('verification')), else_=0)
+            + db.case((table.c.profile_complete, rules.reward('profile_complete')), else_=0)
+        )
+
+    @staticmethod
+    def increment(deltas):
+        if not deltas:
+            return
+        table = UserStats.__table__
+        insert = dialect_insert(db.session, table)
+        updates = {column: table.c[column] + insert.excluded[column] for column in UserStatsService.COUNTERS + ('xp',)}
+        updates['updated_at'] = insert.excluded.updated_at
+        rules = _get_rules()
+        now = datetime.utcnow()
+        db.session.execute(
+            insert.on_conflict_do_update(index_elements=['user_id'], set_=updates),
+            [
+                {
+                    **UserStatsService._empty_row(),
+                    **{c: counts.get(c, 0) for c in UserStatsService.COUNTERS},
+                    'user_id': user_id,
+                    'xp': rules.counter_xp(counts),
+                    'updated_at': now
+                }
+                for user_id, counts in sorted(deltas.items())
+            ]
+        )
+
+    @staticmethod
+    def refresh_profile(user):
+        from services.gamification_service import GamificationService
+        profile = user.profile
+        values = {
+            'is_verified': bool(profile and profile.is_verified),
+            'profile_complete': GamificationService.profile_completion(profile) >= 100,
+            'location': profile.location if profile else None
+        }
+        table = UserStats.__table__
+        insert = dialect_insert(db.session, table).values(
+            **{**UserStatsService._empty_row(), **values, 'user_id': user.id, 'updated_at': datetime.utcnow()}
+        )
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['user_id'],
+            set_={column: insert.excluded[column] for column in values}
+        ))
+        db.session.execute(db.update(table).where(table.c.user_id == user.id).values(
+            xp=UserStatsService.xp_expression(GamificationService.get_rules())
+        ))
+
+    @staticmethod
+    def recompute_xp(engine=None):
+        """Realign stored xp with the current rewards in its own transaction.
+        Under PostgreSQL a concurrent call returns 0 instead of repeating the
+        update another process is already running."""
+        engine = engine or db.engine
+        table = UserStats.__table__
+        xp = UserStatsService.xp_expression(_get_rules())
+        with engine.begin() as conn:
+            if engine.dialect.name == 'postgresql' and not conn.execute(
+                db.text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': UserStatsService.XP_LOCK_KEY}
+            ).scalar():
+                return 0
+            return conn.execute(db.update(table).where(table.c.xp != xp).values(xp=xp)).rowcount
+
+    @staticmethod
+    def schedule_xp_recompute():
+        engine = db.engine
+
+        def run():
+            try:
+                logger.info("Recomputed XP of %d users", UserStatsService.recompute_xp(engine))
+            except Exception:
+                logger.exception("XP recompute failed")
+
+        threading.Thread(target=run, name='xp-recompute', daemon=True).start()
+
+    @staticmethod
+    def backfill(chunk_size=5000):
+        missing = db.session.query(User.id).filter(
+            ~db.session.query(UserStats.user_id).filter(UserStats.user_id == User.id).exists()
+        )
+        user_ids = [user_id for (user_id,) in missing]
+        for start in range(0, len(user_ids), chunk_size):
+            UserStatsService._backfill_chunk(user_ids[start:start + chunk_size])
+        db.session.commit()
+        return len(user_ids)
+
+    @staticmethod
+    def _backfill_chunk(user_ids):
+        def grouped(column, count_expr):
+            return dict(db.session.query(column, count_expr).filter(column.in_(user_ids)).group_by(column))
+
+        counts = {
+            'match_count': grouped(ConversationSummary.user_id, db.func.count()),
+            'message_count': grouped(Message.sender_id, db.func.count()),
+            'likes_sent': grouped(Like.sender_id, db.func.count()),
+            'likes_received': grouped(Like.receiver_id, db.func.count()),
+            'views': grouped(Profile.user_id, db.func.coalesce(db.func.sum(Profile.views_count), 0))
+        }
+        from services.gamification_service import GamificationService
+        profiles = {profile.user_id: profile for profile in Profile.query.filter(Profile.user_id.in_(user_ids))}
+        rules = GamificationService.get_rules()
+        now = datetime.utcnow()
+        rows = []
+        for user_id in user_ids:
+            profile = profiles.get(user_id)
+            row = {c: counts[c].get(user_id, 0) for c in UserStatsService.COUNTERS}
+            row.update(
+                user_id=user_id,
+                is_verified=bool(profile and profile.is_verified),
+                profile_complete=GamificationService.profile_completion(profile) >= 100,
+                location=profile.location if profile else None,
+                updated_at=now
+            )
+            row['xp'] = rules.counter_xp(row) + rules.bonus_xp(row['is_verified'], row['profile_complete'])
+            rows.append(row)
+        db.session.execute(insert_ignore(db.session, UserStats.__table__, ['user_id']), rows)
@@ -54,6 +54,8 @@ class VerificationService:
             )
             db.session.add(log)
         
+        from services.user_stats_service import UserStatsService
+        UserStatsService.refresh_profile(profile.user)
         db.session.commit()
         
         from services.notification_service import NotificationService
@@ -0,0 +1,148 @@
+from flask import current_app
+from models import db, User, Profile, ProfileViewBucket, ProfileView
+from services.user_stats_service import UserStatsService
+from utils.db import dialect_insert, insert_ignore
+from collections import Counter
+from datetime import datetime, timedelta
+import atexit
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('shida.view_counts')
+
+class ViewCountService:
+    FLUSH_INTERVAL = int(os.environ.get('VIEW_COUNT_FLUSH_INTERVAL', 10))
+    RETENTION_DAYS = int(os.environ.get('VIEW_COUNT_RETENTION_DAYS', 90))
+    VIEWER_RETENTION_DAYS = int(os.environ.get('PROFILE_VIEWER_RETENTION_DAYS', 30))
+    VIEWERS_PAGE_SIZE = 20
+
+    _lock = threading.Lock()
+    _pending = Counter()
+    _pending_viewers = set()
+    _app = None
+
+    @classmethod
+    def record(cls, profile, viewer=None):
+        day = datetime.utcnow().date()
+        with cls._lock:
+            cls._pending[(profile.id, profile.user_id, day)] += 1
+            if viewer is not None and not viewer.ghost_mode and viewer.id != profile.user_id:
+                cls._pending_viewers.add((profile.user_id, day, viewer.id))
+            if cls._app is None:
+                cls._app = current_app._get_current_object()
+                threading.Thread(target=cls._flush_loop, name='view-count-flush', daemon=True).start()
+                atexit.register(cls.flush)
+
+    @classmethod
+    def _flush_loop(cls):
+        while True:
+            time.sleep(cls.FLUSH_INTERVAL)
+            try:
+                cls.flush()
+            except Exception:
+                logger.exception("View count flush failed")
+
+    @classmethod
+    def flush(cls):
+        with cls._lock:
+            pending, cls._pending = cls._pending, Counter()
+            viewers, cls._pending_viewers = cls._pending_viewers, set()
+            app = cls._app
+        if not pending or app is None:
+            return 0
+
+        with app.app_context():
+            try:
+                cls._write(pending)
+                if viewers:
+                    cls._write_viewers(viewers)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                with cls._lock:
+                    cls._pending.update(pending)
+                    cls._pending_viewers |= viewers
+                raise
+            finally:
+                db.session.remove()
+        return sum(pending.values())
+
+    @staticmethod
+    def _write(pending):
+        buckets = ProfileViewBucket.__table__
+        insert = dialect_insert(db.session, buckets)
+        upsert = insert.on_conflict_do_update(
+            index_elements=['profile_id', 'day'],
+            set_={'views': buckets.c.views + insert.excluded.views}
+        )
+        db.session.execute(upsert, [
+            {'profile_id': profile_id, 'day': day, 'views': views}
+            for (profile_id, _, day), views in sorted(pending.items())
+        ])
+
+        totals = Counter()
+        user_views = Counter()
+        for (profile_id, user_id, _), views in pending.items():
+            totals[profile_id] += views
+            user_views[user_id] += views
+        profiles = Profile.__table__
+        db.session.execute(
+            db.update(profiles).where(profiles.c.id == db.bindparam('b_profile_id')).values(
+                views_count=db.func.coalesce(profiles.c.views_count, 0) + db.bindparam('b_views')
+            ),
+            [{'b_profile_id': profile_id, 'b_views': views} for profile_id, views in sorted(totals.items())]
+        )
+        UserStatsService.increment({user_id: {'views': views} for user_id, views in user_views.items()})
+
+    @staticmethod
+    def _write_viewers(viewers):
+        db.session.execute(
+            insert_ignore(db.session, ProfileView.__table__, ['viewed_user_id', 'day', 'viewer_id']),
+            [{'viewed_user_id': viewed, 'day': day, 'viewer_id': viewer} for viewed, day, viewer in sorted(viewers)]
+        )
+
+    @staticmethod
+    def get_recent_viewers(user, page=1, per_page=None):
+        per_page = max(1, min(per_page or ViewCountService.VIEWERS_PAGE_SIZE, 100))
+        since = datetime.utcnow().date() - timedelta(days=ViewCountService.VIEWER_RETENTION_DAYS)
+        query = db.session.query(ProfileView.day, Profile).join(
+            Profile, Profile.user_id == ProfileView.viewer_id
+        ).join(User, User.id == ProfileView.viewer_id).filter(
+            ProfileView.viewed_user_id == user.id,
+            ProfileView.day >= since,
+            User.is_banned == False,
+            User.ghost_mode == False
+        )
+
+        if not user.is_vip:
+            return {'count': query.with_entities(db.func.count(db.distinct(ProfileView.viewer_id))).scalar(), 'viewers': None}
+
+        rows = query.order_by(ProfileView.day.desc(), ProfileView.viewer_id.desc()).offset(
+            (page - 1) * per_page
+        ).limit(per_page + 1).all()
+        return {
+            'page': page,
+            'has_more': len(rows) > per_page,
+            'viewers': [
+                {'profile': profile.to_dict(), 'day': day.isoformat()}
+                for day, profile in rows[:per_page]
+            ]
+        }
+
+    @staticmethod
+    def daily_views(profile_id, since):
+        return dict(db.session.query(ProfileViewBucket.day, ProfileViewBucket.views).filter(
+            ProfileViewBucket.profile_id == profile_id,
+            ProfileViewBucket.day >= since
+        ))
+
+    @staticmethod
+    def purge_expired():
+        cutoff = datetime.utcnow().date() - timedelta(days=ViewCountService.RETENTION_DAYS)
+        removed = ProfileViewBucket.query.filter(ProfileViewBucket.day < cutoff).delete(synchronize_session=False)
+        viewer_cutoff = datetime.utcnow().date() - timedelta(days=ViewCountService.VIEWER_RETENTION_DAYS)
+        removed += ProfileView.query.filter(ProfileView.day < viewer_cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return removed
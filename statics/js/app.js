@@ -460,16 +460,43 @@ const Negotiations = {
 const Chat = {
     matchId: null,
     messages: [],
+    nextCursor: null,
+    loadingOlder: false,
+    lastEventId: null,
     
     init(matchId) {
         this.matchId = matchId;
         this.loadMessages();
         this.setupMessageInput();
+        this.setupHistoryScroll();
+        this.subscribe();
+    },
+    
+    subscribe() {
+        if (!window.EventSource) return;
+        
+        const query = this.lastEventId ? `?last_event_id=${this.lastEventId}` : '';
+        const source = new EventSource(`/api/stream${query}`);
+        source.addEventListener('error', () => {
+            // The browser gives up on a non-200 reply (503 when the server is
+            // busy), so reconnect after a randomized delay.
+            if (source.readyState !== EventSource.CLOSED) return;
+            setTimeout(() => this.subscribe(), 10000 + Math.random() * 10000);
+        });
+        source.addEventListener('message_created', (event) => {
+            this.lastEventId = event.lastEventId;
+            const message = JSON.parse(event.data);
+            if (message.match_id !== this.matchId) return;
+            if (this.messages.some(m => m.id === message.id)) return;
+            this.messages.push(message);
+            this.renderMessages();
+        });
     },
     
     async loadMessages() {
         try {
             const response = await fetch(`/api/matches/${this.matchId}/messages`);
+            this.nextCursor = response.headers.get('X-Next-Cursor');
             this.messages = await response.json();
             this.renderMessages();
         } catch (error) {
@@ -477,6 +504,35 @@ const Chat = {
         }
     },
     
+    async loadOlderMessages() {
+        if (!this.nextCursor || this.loadingOlder) return;
+        this.loadingOlder = true;
+        
+        const container = document.getElementById('chatMessages');
+        const previousHeight = container ? container.scrollHeight : 0;
+        try {
+            const response = await fetch(`/api/matches/${this.matchId}/messages?before=${encodeURIComponent(this.nextCursor)}`);
+            this.nextCursor = response.headers.get('X-Next-Cursor');
+            const older = await response.json();
+            this.messages = older.concat(this.messages);
+            this.renderMessages();
+            if (container) container.scrollTop = container.scrollHeight - previousHeight;
+        } catch (error) {
+            console.error('Failed to load older messages:', error);
+        } finally {
+            this.loadingOlder = false;
+        }
+    },
+    
+    setupHistoryScroll() {
+        const container = document.getElementById('chatMessages');
+        if (!container) return;
+        
+        container.addEventListener('scroll', () => {
+            if (container.scrollTop < 50) this.loadOlderMessages();
+        });
+    },
+    
     renderMessages() {
         const container = document.getElementById('chatMessages');
         if (!container) return;
@@ -0,0 +1,56 @@
+import random
+from types import SimpleNamespace
+
+from services.compatibility_engine import CompatibilityEngine
+from services.match_service import MatchService
+
+OBJECTIVES = ['Amitié', 'Construction', 'Mariage', 'Mariage & Sérieux', 'Autre', None, '']
+RELIGIONS = ['Chrétienne', 'Catholique', 'Musulmane', None, '']
+LOCATIONS = ['Kinshasa', 'Gombe', 'Lubumbashi', None, '']
+TRIBES = ['Luba', 'Kongo', 'Mongo', None]
+PROFESSIONS = ['Médecin', 'Ingénieur', 'Enseignant', None]
+AGES = [None, 0, 18, 20, 22, 25, 27, 30, 33, 35, 41, 50, 65]
+INTERESTS = [
+    None, '', '[]', '["Musique"]', '["Musique","Voyage"]', '["Sport","Voyage","Lecture"]',
+    '["Cuisine","Danse","Musique","Sport"]', 'Musique, Voyage', '5', '"abc"', '{"a": 1}', 'not json'
+]
+CONFIGS = [
+    {'objective_weight': 0.25, 'religion_weight': 0.2, 'location_weight': 0.15,
+     'profession_weight': 0.1, 'age_weight': 0.15, 'interests_weight': 0.15},
+    {'objective_weight': 0.4, 'religion_weight': 0.05, 'location_weight': 0.3,
+     'profession_weight': 0.0, 'age_weight': 0.1, 'interests_weight': 0.33},
+]
+
+
+def random_profile(rng, profile_id):
+    return SimpleNamespace(
+        id=profile_id,
+        user_id=profile_id,
+        objective=rng.choice(OBJECTIVES),
+        religion=rng.choice(RELIGIONS),
+        location=rng.choice(LOCATIONS),
+        tribe=rng.choice(TRIBES),
+        profession=rng.choice(PROFESSIONS),
+        age=rng.choice(AGES),
+        interests=rng.choice(INTERESTS)
+    )
+
+
+def test_batch_scores_match_per_pair_function():
+    rng = random.Random(2024)
+    for config in CONFIGS:
+        for viewer_id in range(200):
+            viewer = random_profile(rng, viewer_id)
+            candidates = [random_profile(rng, 1000 + i) for i in range(50)]
+            expected = [MatchService.calculate_compatibility(viewer, c, config) for c in candidates]
+            assert CompatibilityEngine.score(viewer, candidates, config) == expected
+
+
+def test_rank_orders_by_score_and_keeps_ties_stable():
+    rng = random.Random(7)
+    viewer = random_profile(rng, 0)
+    candidates = [random_profile(rng, i) for i in range(1, 300)]
+    ranked = CompatibilityEngine.rank(viewer, candidates, CONFIGS[0], limit=40)
+    scores = CompatibilityEngine.score(viewer, candidates, CONFIGS[0])
+    expected = sorted(range(len(candidates)), key=lambda i: -scores[i])[:40]
+    assert [row.id for row, _ in ranked] == [candidates[i].id for i in expected]
@@ -0,0 +1,152 @@
+import json
+import os
+import random
+from types import SimpleNamespace
+
+from services.gamification_rules import DEFAULT_LEVEL, GamificationRules
+from services.gamification_service import GamificationService
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'gamification.json')
+
+OPTIONAL = [None, '', 'x']
+VIP_TYPES = ['free', 'Gold', 'Platinum']
+COUNTS = [0, 1, 2, 5, 9, 10, 11, 25, 50, 99, 100, 101, 250, 1000]
+
+
+def reference_badges(config, user, stats, completion):
+    badges = []
+    badge_defs = {b['id']: b for b in config.get('badges', [])}
+    if user.profile and user.profile.is_verified:
+        if 'verified' in badge_defs:
+            badges.append(badge_defs['verified'])
+    if user.is_vip:
+        if user.vip_type == 'Gold' and 'vip_gold' in badge_defs:
+            badges.append(badge_defs['vip_gold'])
+        elif user.vip_type == 'Platinum' and 'vip_platinum' in badge_defs:
+            badges.append(badge_defs['vip_platinum'])
+    if stats.views >= 100 and 'popular' in badge_defs:
+        badges.append(badge_defs['popular'])
+    if stats.match_count >= 10 and 'match_master' in badge_defs:
+        badges.append(badge_defs['match_master'])
+    if completion >= 100 and 'profile_complete' in badge_defs:
+        badges.append(badge_defs['profile_complete'])
+    return badges
+
+
+def reference_xp(config, user, stats, completion):
+    xp_rewards = config.get('xp_rewards', {})
+    xp = stats.views * xp_rewards.get('profile_view', 1)
+    xp += stats.match_count * xp_rewards.get('match', 25)
+    xp += stats.message_count * xp_rewards.get('message_sent', 5)
+    if user.profile and user.profile.is_verified:
+        xp += xp_rewards.get('verification', 100)
+    if completion >= 100:
+        xp += xp_rewards.get('profile_complete', 50)
+    return xp
+
+
+def reference_level(config, xp):
+    levels = config.get('levels', [])
+    current_level = levels[0] if levels else dict(DEFAULT_LEVEL)
+    for level in levels:
+        if xp >= level['min_xp']:
+            current_level = level
+        else:
+            break
+    next_level = None
+    for level in levels:
+        if level['min_xp'] > xp:
+            next_level = level
+            break
+    if next_level:
+        current_min = current_level['min_xp']
+        progress = int((xp - current_min) / (next_level['min_xp'] - current_min) * 100)
+    else:
+        progress = 100
+    return {'current': current_level, 'next': next_level, 'xp': xp, 'progress': progress}
+
+
+def reference_achievements(config, user, stats, completion):
+    completed = []
+    pending = []
+    for achievement in config.get('achievements', []):
+        req = achievement.get('requirement', {})
+        req_type = req.get('type')
+        is_completed = False
+        progress = 0
+        if req_type == 'matches':
+            target = req.get('count', 1)
+            progress = min(stats.match_count / target * 100, 100)
+            is_completed = stats.match_count >= target
+        elif req_type == 'messages_sent':
+            target = req.get('count', 1)
+            progress = min(stats.message_count / target * 100, 100)
+            is_completed = stats.message_count >= target
+        elif req_type == 'profile_completion':
+            target = req.get('percentage', 100)
+            progress = min(completion / target * 100, 100)
+            is_completed = completion >= target
+        elif req_type == 'verification':
+            is_completed = bool(user.profile and user.profile.is_verified)
+            progress = 100 if is_completed else 0
+        data = {**achievement, 'progress': int(progress), 'is_completed': is_completed}
+        (completed if is_completed else pending).append(data)
+    return {'completed': completed, 'pending': pending}
+
+
+def random_user(rng):
+    profile = None
+    if rng.random() < 0.9:
+        profile = SimpleNamespace(
+            name='Naomie', age=rng.choice([None, 25]), bio=rng.choice(OPTIONAL), photo_url=rng.choice(OPTIONAL),
+            religion=rng.choice(OPTIONAL), tribe=rng.choice(OPTIONAL), profession=rng.choice(OPTIONAL),
+            objective=rng.choice(OPTIONAL), location=rng.choice(OPTIONAL), interests=rng.choice(OPTIONAL),
+            is_verified=rng.choice([True, False, None])
+        )
+    user = SimpleNamespace(profile=profile, is_vip=rng.choice([True, False]), vip_type=rng.choice(VIP_TYPES))
+    stats = SimpleNamespace(views=rng.choice(COUNTS), match_count=rng.choice(COUNTS), message_count=rng.choice(COUNTS))
+    return user, stats
+
+
+def test_rules_match_reference_implementation():
+    with open(CONFIG_PATH, encoding='utf-8') as f:
+        config = json.load(f)
+    rules = GamificationRules(config)
+    rng = random.Random(22)
+    for _ in range(3200):
+        user, stats = random_user(rng)
+        completion = GamificationService.profile_completion(user.profile)
+        xp = rules.xp_for(user, stats, completion)
+        assert rules.badges_for(user, stats, completion) == reference_badges(config, user, stats, completion)
+        assert xp == reference_xp(config, user, stats, completion)
+        assert rules.level_for(xp) == reference_level(config, xp)
+        assert rules.achievements_for(user, stats, completion) == reference_achievements(config, user, stats, completion)
+
+
+def test_level_without_levels_uses_default():
+    rules = GamificationRules({'levels': []})
+    assert rules.level_for(0) == reference_level({}, 0)
+    assert rules.level_for(500) == {'current': dict(DEFAULT_LEVEL), 'next': None, 'xp': 500, 'progress': 100}
+
+
+def test_rules_reload_when_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / 'gamification.json'
+    path.write_text(json.dumps({'levels': [{'level': 1, 'name': 'A', 'min_xp': 0}]}))
+    monkeypatch.setattr(GamificationService, 'CONFIG_PATH', str(path))
+    monkeypatch.setattr(GamificationService, '_rules', None)
+    monkeypatch.setattr(GamificationService, '_rules_stamp', None)
+
+    first = GamificationService.get_rules()
+    assert GamificationService.get_rules() is first
+    assert first.level_for(10)['current']['name'] == 'A'
+
+    mtime = os.stat(path).st_mtime_ns
+    path.write_text(json.dumps({'levels': [{'level': 1, 'name': 'B', 'min_xp': 0}]}))
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+    second = GamificationService.get_rules()
+    assert second is not first
+    assert second.level_for(10)['current']['name'] == 'B'
+
+    path.write_text('{not json')
+    os.utime(path, ns=(mtime + 2 * 10**9, mtime + 2 * 10**9))
+    assert GamificationService.get_rules() is second
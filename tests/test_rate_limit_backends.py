@@ -0,0 +1,104 @@
+import random
+
+import pytest
+
+from security.rate_limit_backends import (
+    ALLOWED, BLOCKED, LIMITED, MemoryBackend, SqlBackend, _estimate, sqlite_engine
+)
+
+LIMITS = {'requests': 3, 'window': 60, 'block_duration': 120}
+START = 6000.0
+
+
+def test_estimate_weights_previous_window():
+    assert _estimate(100, 2, 4, 6000, 60) == 6
+    assert _estimate(100, 2, 4, 6015, 60) == 4 * 0.75 + 2
+    assert _estimate(99, 4, 1, 6015, 60) == 4 * 0.75
+    assert _estimate(98, 4, 1, 6015, 60) == 0
+
+
+def test_hit_limits_then_blocks_until_block_ends():
+    backend = MemoryBackend()
+    assert [backend.hit('login:a', LIMITS, START) for _ in range(3)] == [ALLOWED] * 3
+    assert backend.hit('login:a', LIMITS, START + 1) == LIMITED
+    assert backend.blocked_until('login:a') == START + 1 + LIMITS['block_duration']
+    assert backend.hit('login:a', LIMITS, START + 2) == BLOCKED
+    assert backend.used('login:a', LIMITS, START + 2) == 3
+    assert backend.hit('login:a', LIMITS, START + 120) == BLOCKED
+
+    assert backend.hit('login:a', LIMITS, START + 121) == ALLOWED
+    assert backend.hit('login:b', LIMITS, START + 2) == ALLOWED
+
+
+def test_hit_counts_previous_window_by_overlap():
+    backend = MemoryBackend()
+    backend.record('login:a', LIMITS, START + 30, 3)
+
+    now = START + 90
+    assert backend.used('login:a', LIMITS, now) == 1.5
+    assert [backend.hit('login:a', LIMITS, now) for _ in range(3)] == [ALLOWED, ALLOWED, LIMITED]
+    assert backend.used('login:a', LIMITS, now) == 3.5
+
+
+def test_record_adds_count_to_current_window():
+    backend = MemoryBackend()
+    backend.record('message:a', LIMITS, START, 2)
+    backend.record('message:a', LIMITS, START + 10, 1)
+    assert backend.used('message:a', LIMITS, START + 10) == 3
+    assert backend.hit('message:a', LIMITS, START + 10) == LIMITED
+    assert backend.used('message:b', LIMITS, START) == 0
+
+
+def test_reset_identifier_drops_all_actions():
+    backend = MemoryBackend()
+    for key in ('login:a', 'swipe:a', 'login:ab'):
+        backend.record(key, LIMITS, START, 3)
+    backend.reset_identifier('a')
+    assert set(backend.windows) == {'login:ab'}
+
+
+def test_sweep_evicts_expired_keys_only():
+    backend = MemoryBackend()
+    backend.SWEEP_BATCH = 2
+    for index in range(5):
+        backend.hit(f'login:{index}', LIMITS, START)
+    backend.hit('login:late', LIMITS, START + 60)
+    expires_at = (100 + 2) * 60 + LIMITS['block_duration']
+
+    assert backend.sweep(expires_at - 1) == 0
+    assert backend.sweep(expires_at) == 5
+    assert set(backend.windows) == {'login:late'}
+    assert backend.stats(expires_at)['keys'] == 1
+    assert backend.sweep(expires_at + 60) == 1
+    assert backend.windows == {}
+
+
+def replay(backend, seed=25):
+    rng = random.Random(seed)
+    limits = {'login': LIMITS, 'api': {'requests': 5, 'window': 10, 'block_duration': 7}}
+    now = START
+    results = []
+    for _ in range(1500):
+        now += rng.choice([0.001, 0.001, 0.25, 1, 3.5, 9, 40])
+        action = rng.choice(list(limits))
+        key = f"{action}:{rng.choice('abc')}"
+        op = rng.random()
+        if op < 0.7:
+            results.append(backend.hit(key, limits[action], now))
+        elif op < 0.8:
+            backend.record(key, limits[action], now, rng.choice([1, 2, 5]))
+        elif op < 0.9:
+            results.append(backend.used(key, limits[action], now))
+        elif op < 0.98:
+            results.append(backend.blocked_until(key))
+        else:
+            backend.reset(key)
+    results.append(backend.sweep(now))
+    return results
+
+
+def test_sql_backend_matches_memory_backend(tmp_path):
+    backend = SqlBackend(sqlite_engine(tmp_path / 'rate_limits.sqlite3'), 'sqlite')
+    expected = replay(MemoryBackend())
+    assert {BLOCKED, LIMITED, ALLOWED} <= set(expected)
+    assert replay(backend) == pytest.approx(expected)
@@ -0,0 +1,131 @@
+import pytest
+from flask import Flask
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from data.upgrade_db import upgrade
+from models import db, Like, Match, Message, ConversationSummary, Profile, UserStats
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'shida.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def test_read_watermarks_seeded_from_is_read(app):
+    db.session.add(Match(id=1, user1_id=1, user2_id=2))
+    db.session.add_all([
+        Message(id=1, match_id=1, sender_id=2, content='a', is_read=True),
+        Message(id=2, match_id=1, sender_id=2, content='b', is_read=True),
+        Message(id=3, match_id=1, sender_id=2, content='c', is_read=False),
+        Message(id=4, match_id=1, sender_id=1, content='d', is_read=False),
+    ])
+    db.session.add_all([
+        ConversationSummary(match_id=1, user_id=1, other_user_id=2),
+        ConversationSummary(match_id=1, user_id=2, other_user_id=1),
+    ])
+    db.session.commit()
+    db.session.execute(text('ALTER TABLE conversation_summaries DROP COLUMN last_read_message_id'))
+    db.session.execute(text('DROP INDEX ix_messages_match_created_id'))
+    db.session.commit()
+
+    assert upgrade(db) == ['add_read_watermarks', 'create_missing_indexes']
+
+    watermarks = dict(db.session.query(ConversationSummary.user_id, ConversationSummary.last_read_message_id))
+    assert watermarks == {1: 2, 2: 0}
+    assert 'ix_messages_match_created_id' in {index['name'] for index in inspect(db.engine).get_indexes('messages')}
+    assert upgrade(db) == []
+
+
+def test_matches_merged_into_canonical_pairs(app):
+    db.session.execute(text('DROP TABLE matches'))
+    db.session.execute(text(
+        'CREATE TABLE matches (id INTEGER PRIMARY KEY, user1_id INTEGER NOT NULL, user2_id INTEGER NOT NULL, '
+        'created_at DATETIME, is_active BOOLEAN, compatibility_score FLOAT)'
+    ))
+    db.session.execute(text(
+        'INSERT INTO matches (id, user1_id, user2_id) VALUES (1, 2, 1), (2, 1, 2), (3, 4, 3), (4, 5, 6)'
+    ))
+    db.session.add_all([
+        Message(id=1, match_id=1, sender_id=2, content='a'),
+        Message(id=2, match_id=2, sender_id=2, content='b'),
+        Message(id=3, match_id=2, sender_id=1, content='c'),
+    ])
+    db.session.add_all([
+        ConversationSummary(match_id=1, user_id=1, other_user_id=2, last_read_message_id=1),
+        ConversationSummary(match_id=1, user_id=2, other_user_id=1),
+        ConversationSummary(match_id=2, user_id=1, other_user_id=2, last_read_message_id=2),
+        ConversationSummary(match_id=2, user_id=2, other_user_id=1),
+    ])
+    db.session.commit()
+
+    assert 'canonicalize_matches' in upgrade(db)
+
+    assert db.session.query(Match.id, Match.user1_id, Match.user2_id).order_by(Match.id).all() == [
+        (1, 1, 2), (3, 3, 4), (4, 5, 6)
+    ]
+    assert {message.match_id for message in Message.query} == {1}
+    summaries = {
+        summary.user_id: (summary.last_read_message_id, summary.unread_count, summary.last_message_id)
+        for summary in ConversationSummary.query.filter_by(match_id=1)
+    }
+    assert summaries == {1: (2, 0, 3), 2: (0, 1, 3)}
+    assert ConversationSummary.query.filter_by(match_id=2).count() == 0
+
+    db.session.add(Match(user1_id=1, user2_id=2))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    assert upgrade(db) == []
+
+
+def test_duplicate_likes_removed(app):
+    db.session.execute(text('DROP TABLE likes'))
+    db.session.execute(text(
+        'CREATE TABLE likes (id INTEGER PRIMARY KEY, sender_id INTEGER NOT NULL, receiver_id INTEGER NOT NULL, '
+        'created_at DATETIME, is_match BOOLEAN)'
+    ))
+    db.session.execute(text(
+        'INSERT INTO likes (id, sender_id, receiver_id, is_match) VALUES (1, 1, 2, 0), (2, 1, 2, 1), (3, 2, 1, 0), (4, 1, 2, 0)'
+    ))
+    db.session.commit()
+
+    assert 'dedupe_likes' in upgrade(db)
+
+    assert db.session.query(Like.id, Like.is_match).order_by(Like.id).all() == [(1, True), (3, False)]
+    db.session.add(Like(sender_id=2, receiver_id=1))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    assert upgrade(db) == []
+
+
+def test_user_stats_xp_columns_filled(app):
+    from services.gamification_service import GamificationService
+
+    db.session.add(Profile(user_id=1, name='Naomie', age=25, location='Kinshasa', is_verified=True))
+    db.session.commit()
+    for index in ('ix_user_stats_xp', 'ix_user_stats_location_xp'):
+        db.session.execute(text(f'DROP INDEX {index}'))
+    for column in ('xp', 'location', 'profile_complete', 'is_verified'):
+        db.session.execute(text(f'ALTER TABLE user_stats DROP COLUMN {column}'))
+    db.session.execute(text(
+        'INSERT INTO user_stats (user_id, match_count, message_count, likes_sent, likes_received, views) '
+        'VALUES (1, 2, 3, 0, 0, 10)'
+    ))
+    db.session.commit()
+
+    assert upgrade(db) == ['add_user_stats_xp', 'create_missing_indexes', 'recompute_xp']
+
+    stats = db.session.get(UserStats, 1)
+    rules = GamificationService.get_rules()
+    complete = GamificationService.profile_completion(db.session.get(Profile, 1)) >= 100
+    assert (stats.is_verified, stats.profile_complete, stats.location) == (True, complete, 'Kinshasa')
+    assert stats.xp == rules.counter_xp({'views': 10, 'match_count': 2, 'message_count': 3}) + rules.bonus_xp(True, complete)
+    assert upgrade(db) == []
@@ -0,0 +1,36 @@
+import os
+import tempfile
+import time
+
+CACHE_DIR = os.environ.get('SHIDA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'shida'))
+
+
+class VersionStamp:
+    """Cross-process invalidation marker shared by every worker on the host.
+
+    bump() atomically replaces a small file, so read() only needs a stat()
+    call to notice that another worker invalidated its in-memory copy.
+    """
+
+    def __init__(self, name):
+        self.path = os.path.join(CACHE_DIR, f'{name}.stamp')
+
+    def read(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def bump(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix='.stamp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(str(time.time_ns()))
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.read()
@@ -0,0 +1,16 @@
+from sqlalchemy import insert as generic_insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def dialect_insert(bind, table):
+    """INSERT construct supporting on_conflict_* for a session's, engine's or connection's database."""
+    dialect = (bind.get_bind() if hasattr(bind, 'get_bind') else bind).dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    return generic_insert(table)
+
+
+def insert_ignore(session, table, index_elements):
+    return dialect_insert(session, table).on_conflict_do_nothing(index_elements=index_elements)
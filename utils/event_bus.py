@@ -0,0 +1,153 @@
+import logging
+import os
+import select
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger('shida.event_bus')
+
+
+class EventBus:
+    """Wakes up the event streams held by this process when a user gets new events.
+
+    Only user ids travel on the bus; the events themselves are read from the
+    user_events table. On PostgreSQL, publish() issues pg_notify inside the
+    writing transaction, so the signal is delivered on commit to every worker
+    LISTENing on the channel (duplicates within a transaction are folded by
+    Postgres). Other databases fall back to an in-process dispatch after commit.
+    Signals are collected for BATCH_WINDOW seconds and deduplicated per user
+    before waking subscribers.
+    """
+    CHANNEL = 'shida_events'
+    BATCH_WINDOW = float(os.environ.get('EVENT_BUS_BATCH_WINDOW', 0.05))
+    LISTEN_TIMEOUT = 30
+    RECONNECT_DELAY = 5
+
+    _lock = threading.Lock()
+    _ready = threading.Condition(_lock)
+    _subscribers = {}
+    _pending = set()
+    _backend = None
+    _stats = {'published': 0, 'received': 0, 'batches': 0, 'wakeups': 0}
+
+    @classmethod
+    def start(cls, engine):
+        with cls._lock:
+            if cls._backend:
+                return cls._backend
+            cls._backend = 'postgres' if engine.dialect.name == 'postgresql' else 'memory'
+
+        threading.Thread(target=cls._dispatch_loop, name='event-bus-dispatch', daemon=True).start()
+        if cls._backend == 'postgres':
+            threading.Thread(target=cls._listen_loop, args=(engine,), name='event-bus-listen', daemon=True).start()
+        return cls._backend
+
+    @classmethod
+    def publish(cls, session, user_id):
+        if session.get_bind().dialect.name == 'postgresql':
+            session.execute(
+                text('SELECT pg_notify(:channel, :payload)'),
+                {'channel': cls.CHANNEL, 'payload': str(user_id)}
+            )
+        session.info.setdefault('event_bus_pending', set()).add(user_id)
+
+    @classmethod
+    def subscribe(cls, user_id):
+        waiter = threading.Event()
+        with cls._lock:
+            cls._subscribers.setdefault(user_id, set()).add(waiter)
+        return waiter
+
+    @classmethod
+    def unsubscribe(cls, user_id, waiter):
+        with cls._lock:
+            waiters = cls._subscribers.get(user_id)
+            if waiters:
+                waiters.discard(waiter)
+                if not waiters:
+                    del cls._subscribers[user_id]
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return dict(
+                cls._stats,
+                backend=cls._backend,
+                subscribed_users=len(cls._subscribers),
+                streams=sum(len(waiters) for waiters in cls._subscribers.values())
+            )
+
+    @classmethod
+    def _enqueue(cls, user_ids):
+        with cls._ready:
+            cls._stats['received'] += len(user_ids)
+            cls._pending.update(user_ids)
+            cls._ready.notify()
+
+    @classmethod
+    def _dispatch_loop(cls):
+        while True:
+            with cls._ready:
+                while not cls._pending:
+                    cls._ready.wait()
+            time.sleep(cls.BATCH_WINDOW)
+
+            with cls._lock:
+                user_ids, cls._pending = cls._pending, set()
+                waiters = [waiter for user_id in user_ids for waiter in cls._subscribers.get(user_id, ())]
+                cls._stats['batches'] += 1
+                cls._stats['wakeups'] += len(waiters)
+            for waiter in waiters:
+                waiter.set()
+
+    @classmethod
+    def _listen_loop(cls, engine):
+        while True:
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                connection.detach()
+                driver = connection.driver_connection
+                driver.autocommit = True
+                driver.cursor().execute(f'LISTEN {cls.CHANNEL}')
+
+                while True:
+                    if select.select([driver], [], [], cls.LISTEN_TIMEOUT) == ([], [], []):
+                        continue
+                    driver.poll()
+                    user_ids = set()
+                    while driver.notifies:
+                        payload = driver.notifies.pop(0).payload
+                        if payload.isdigit():
+                            user_ids.add(int(payload))
+                    if user_ids:
+                        cls._enqueue(user_ids)
+            except Exception:
+                logger.exception("Event bus listener failed, reconnecting")
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+                time.sleep(cls.RECONNECT_DELAY)
+
+
+@event.listens_for(Session, 'after_commit')
+def _flush_pending(session):
+    user_ids = session.info.pop('event_bus_pending', None)
+    if not user_ids:
+        return
+    with EventBus._lock:
+        EventBus._stats['published'] += len(user_ids)
+        dispatch_locally = EventBus._backend == 'memory'
+    if dispatch_locally:
+        EventBus._enqueue(user_ids)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('event_bus_pending', None)
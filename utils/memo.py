@@ -0,0 +1,61 @@
+import functools
+
+from flask import g, has_request_context
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoInspectionAvailable
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def _key_part(value):
+    try:
+        state = inspect(value)
+    except NoInspectionAvailable:
+        state = None
+    if state is not None and hasattr(state, 'identity'):
+        if state.identity is None:
+            raise _Uncacheable()
+        return (type(value).__name__, state.identity)
+    try:
+        hash(value)
+    except TypeError:
+        raise _Uncacheable()
+    return value
+
+
+def request_memoized(func):
+    """Cache func's result on flask.g for the rest of the current request.
+
+    Model instances are keyed by their primary key, so the cache must only
+    wrap reads whose inputs do not change during the request. Outside a
+    request, or with unhashable or unsaved arguments, func is called directly.
+    """
+    name = f'{func.__module__}.{func.__qualname__}'
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not has_request_context():
+            return func(*args, **kwargs)
+        try:
+            key = (name, tuple(_key_part(a) for a in args),
+                   tuple(sorted((k, _key_part(v)) for k, v in kwargs.items())))
+        except _Uncacheable:
+            return func(*args, **kwargs)
+
+        memo = g.setdefault('_request_memo', {})
+        stats = g.setdefault('_request_memo_stats', {'hits': 0, 'misses': 0})
+        if key in memo:
+            stats['hits'] += 1
+            return memo[key]
+        stats['misses'] += 1
+        memo[key] = result = func(*args, **kwargs)
+        return result
+
+    return wrapper
+
+
+def memo_stats():
+    """Hits and misses of the current request, or None if nothing was memoized."""
+    return g.get('_request_memo_stats')
@@ -0,0 +1 @@
+# Background workers run outside the gunicorn request path
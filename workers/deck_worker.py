@@ -0,0 +1,81 @@
+"""
+Deck Worker - Precomputes discovery decks off the request path.
+
+Usage:
+    python -m workers.deck_worker [--processes 4] [--interval 30] [--once]
+"""
+import argparse
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger('shida.deck_worker')
+
+_app = None
+
+
+def _init_process():
+    global _app
+    from app import app
+    _app = app
+
+
+def _build_chunk(user_ids):
+    from models import db, User
+    from services.deck_service import DeckService
+    
+    built = 0
+    with _app.app_context():
+        for user_id in user_ids:
+            user = db.session.get(User, user_id)
+            if not user or user.is_banned:
+                continue
+            try:
+                DeckService.build_deck(user)
+                built += 1
+            except Exception:
+                db.session.rollback()
+                logger.exception("Deck build failed for user %s", user_id)
+        db.session.remove()
+    return built
+
+
+def run_once(pool, batch_size=500, chunk_size=25):
+    from models import db
+    from services.deck_service import DeckService
+    
+    with _app.app_context():
+        inserted = DeckService.apply_queued_inserts()
+        if inserted:
+            logger.info("Inserted queued profiles into %d decks", inserted)
+        user_ids = DeckService.users_needing_refresh(limit=batch_size)
+        db.session.remove()
+    
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    return sum(pool.map(_build_chunk, chunks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build discovery decks for active users')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--interval', type=int, default=30)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--chunk-size', type=int, default=25)
+    parser.add_argument('--once', action='store_true')
+    args = parser.parse_args()
+    
+    _init_process()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=args.processes, mp_context=context, initializer=_init_process) as pool:
+        while True:
+            started = time.perf_counter()
+            built = run_once(pool, args.batch_size, args.chunk_size)
+            logger.info("Built %d decks in %.2fs", built, time.perf_counter() - started)
+            if args.once:
+                break
+            time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Maintenance Worker - Purges expired rows on a schedule, off the web workers.
+
+Usage:
+    python -m workers.maintenance_worker [--interval 3600] [--once]
+"""
+import argparse
+import logging
+import time
+
+logger = logging.getLogger('shida.maintenance_worker')
+
+
+def _purges():
+    from services.event_service import EventService
+    from services.seen_set_service import SeenSetService
+    from services.view_count_service import ViewCountService
+
+    return (
+        ('user_events', EventService.purge_expired),
+        ('profile_views', ViewCountService.purge_expired),
+        ('profile_passes', SeenSetService.purge_expired_passes),
+    )
+
+
+def run_once(app):
+    from models import db
+
+    removed = {}
+    with app.app_context():
+        for name, purge in _purges():
+            try:
+                removed[name] = purge()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Purge of %s failed", name)
+        db.session.remove()
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Purge expired events, views and passes')
+    parser.add_argument('--interval', type=int, default=3600)
+    parser.add_argument('--once', action='store_true')
+    args = parser.parse_args()
+
+    from app import app
+    while True:
+        logger.info("Purged %s", run_once(app))
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()